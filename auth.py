@@ -1,5 +1,8 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
@@ -12,7 +15,26 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Coût bcrypt configurable : les hashes créés avec un autre coût sont
+# signalés comme obsolètes et re-hashés à la prochaine connexion
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Pool dédié au hachage pour ne pas bloquer la boucle d'événements.
+# Au-delà de HASHING_POOL_WORKERS + HASHING_POOL_MAX_PENDING opérations en cours,
+# les nouvelles demandes sont refusées (HTTP 503) au lieu d'être mises en file.
+HASHING_POOL_WORKERS = int(os.getenv("HASHING_POOL_WORKERS", "4"))
+HASHING_POOL_MAX_PENDING = int(os.getenv("HASHING_POOL_MAX_PENDING", "32"))
+
+_hashing_executor = ThreadPoolExecutor(
+    max_workers=HASHING_POOL_WORKERS,
+    thread_name_prefix="password-hashing"
+)
+_hashing_slots = threading.BoundedSemaphore(HASHING_POOL_WORKERS + HASHING_POOL_MAX_PENDING)
+
+class HashingPoolSaturated(Exception):
+    pass
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -20,6 +42,24 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_in_hashing_pool(func, *args):
+    if not _hashing_slots.acquire(blocking=False):
+        raise HashingPoolSaturated()
+    try:
+        future = _hashing_executor.submit(func, *args)
+    except BaseException:
+        _hashing_slots.release()
+        raise
+    # Le slot est libéré quand le hachage se termine, même si la requête est annulée
+    future.add_done_callback(lambda _: _hashing_slots.release())
+    return await asyncio.wrap_future(future)
+
+async def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    return await _run_in_hashing_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def hash_password(password) -> str:
+    return await _run_in_hashing_pool(pwd_context.hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
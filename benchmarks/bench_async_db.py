@@ -0,0 +1,112 @@
+# Compare le débit (requêtes/s) des endpoints messages et notifications entre
+# l'ancien chemin synchrone (Session + get_db) et le chemin asynchrone
+# (AsyncSession + get_async_db).
+#
+#   python benchmarks/bench_async_db.py --requests 2000 --concurrency 50
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import httpx
+from fastapi import FastAPI, Depends
+from sqlalchemy.orm import Session
+
+import main
+from auth import create_access_token, get_password_hash
+from database import SessionLocal, get_db
+from models import User, Message, Notification
+from schemas import MessageInDB, Notification as NotificationSchema
+from services.message_service import get_user_messages
+from services.notification_service import get_user_notifications
+
+def seed(messages: int, notifications: int) -> str:
+    db = SessionLocal()
+    users = [
+        User(nom=f"user{i}", prenom="Bench", departement="IT", role="employer",
+             email=f"user{i}@bench.dz", telephone="0", hashed_password=get_password_hash("bench"),
+             is_active=True, is_approved=True)
+        for i in range(2)
+    ]
+    db.add_all(users)
+    db.commit()
+    db.add_all(
+        Message(sender_id=users[1].id, receiver_id=users[0].id, content=f"message {i}")
+        for i in range(messages)
+    )
+    db.add_all(
+        Notification(user_id=users[0].id, title="Bench", message=f"notification {i}", type="bench")
+        for i in range(notifications)
+    )
+    db.commit()
+    email = users[0].email
+    db.close()
+    return create_access_token({"sub": email})
+
+def build_sync_app() -> FastAPI:
+    # Reproduit les anciennes routes synchrones pour la comparaison
+    app = FastAPI()
+
+    @app.get("/messages/", response_model=List[MessageInDB])
+    def get_messages(
+        current_user: Annotated[User, Depends(main.get_current_user)],
+        limit: int = 100,
+        db: Session = Depends(get_db)
+    ):
+        return get_user_messages(db=db, user_id=current_user.id, limit=limit)
+
+    @app.get("/notifications/", response_model=List[NotificationSchema])
+    def get_notifications(
+        current_user: Annotated[User, Depends(main.get_current_user)],
+        limit: int = 100,
+        db: Session = Depends(get_db)
+    ):
+        return get_user_notifications(db, current_user.id, 0, limit)
+
+    return app
+
+async def run(app: FastAPI, path: str, token: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        await client.get(path)  # préchauffage (cache des utilisateurs, pool)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+async def compare(token: str, requests: int, concurrency: int):
+    sync_app = build_sync_app()
+
+    print(f"{'endpoint':<20}{'sync req/s':>14}{'async req/s':>14}")
+    for path in ("/messages/?limit=20", "/notifications/?limit=20"):
+        before = await run(sync_app, path, token, requests, concurrency)
+        after = await run(main.app, path, token, requests, concurrency)
+        print(f"{path.split('?')[0]:<20}{before:>14.1f}{after:>14.1f}")
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    token = seed(args.rows, args.rows)
+    asyncio.run(compare(token, args.requests, args.concurrency))
+
+if __name__ == "__main__":
+    main_cli()
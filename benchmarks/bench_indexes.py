@@ -0,0 +1,161 @@
+# Plans de requête (EXPLAIN QUERY PLAN) et temps d'exécution des requêtes
+# chaudes de la couche services, avant puis après les migrations d'index.
+#
+#   python benchmarks/bench_indexes.py --users 2000 --rows 200000
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from sqlalchemy import text
+from database import engine, init_db
+from migrations import QUERY_INDEXES
+
+QUERIES = {
+    "notifications of a user": (
+        "SELECT * FROM notifications WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 100"
+    ),
+    "received messages": (
+        "SELECT * FROM messages WHERE receiver_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 100"
+    ),
+    "sent messages": (
+        "SELECT * FROM messages WHERE sender_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 100"
+    ),
+    "enrollment lookup": (
+        "SELECT * FROM course_progress WHERE user_id = :user_id AND course_id = :course_id"
+    ),
+    "courses of an instructor": "SELECT * FROM courses WHERE instructor_id = :user_id",
+    "courses of a department": (
+        "SELECT * FROM courses WHERE departement = :departement "
+        "ORDER BY created_at DESC, id DESC LIMIT 100"
+    ),
+    "pending users": "SELECT * FROM users WHERE is_approved = 0",
+}
+
+DEPARTEMENTS = ["IT", "RH", "Finance", "Juridique", "Commercial", "Technique"]
+
+def seed(users: int, rows: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO users (nom, prenom, departement, role, email, is_active, is_approved, created_at) "
+                 "VALUES (:nom, 'Bench', :departement, :role, :email, 1, :is_approved, :created_at)"),
+            [
+                {
+                    "nom": f"user{i}",
+                    "departement": rng.choice(DEPARTEMENTS),
+                    "role": "prof" if i % 20 == 0 else "employer",
+                    "email": f"user{i}@bench.dz",
+                    "is_approved": rng.random() > 0.02,
+                    "created_at": start,
+                }
+                for i in range(users)
+            ]
+        )
+        courses = max(users // 10, 1)
+        connection.execute(
+            text("INSERT INTO courses (title, description, instructor_id, departement, created_at, updated_at) "
+                 "VALUES (:title, '', :instructor_id, :departement, :created_at, :created_at)"),
+            [
+                {
+                    "title": f"course {i}",
+                    "instructor_id": rng.randrange(1, users + 1),
+                    "departement": rng.choice(DEPARTEMENTS),
+                    "created_at": start + timedelta(hours=i),
+                }
+                for i in range(courses)
+            ]
+        )
+        connection.execute(
+            text("INSERT INTO notifications (user_id, title, message, type, is_read, created_at) "
+                 "VALUES (:user_id, 'Bench', 'notification', 'bench', 0, :created_at)"),
+            [
+                {"user_id": rng.randrange(1, users + 1), "created_at": start + timedelta(seconds=i)}
+                for i in range(rows)
+            ]
+        )
+        connection.execute(
+            text("INSERT INTO messages (sender_id, receiver_id, content, is_read, created_at) "
+                 "VALUES (:sender_id, :receiver_id, 'message', 0, :created_at)"),
+            [
+                {
+                    "sender_id": rng.randrange(1, users + 1),
+                    "receiver_id": rng.randrange(1, users + 1),
+                    "created_at": start + timedelta(seconds=i),
+                }
+                for i in range(rows)
+            ]
+        )
+        pairs = {(rng.randrange(1, users + 1), rng.randrange(1, courses + 1)) for _ in range(rows // 4)}
+        connection.execute(
+            text("INSERT INTO course_progress (user_id, course_id, progress, is_completed) "
+                 "VALUES (:user_id, :course_id, 0, 0)"),
+            [{"user_id": user_id, "course_id": course_id} for user_id, course_id in pairs]
+        )
+        connection.execute(text("ANALYZE"))
+
+def drop_migrated_indexes():
+    with engine.begin() as connection:
+        for name, _, _ in QUERY_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        connection.execute(text("DROP INDEX IF EXISTS ix_course_progress_user_id_course_id"))
+        connection.execute(text("DELETE FROM schema_migrations"))
+        connection.execute(text("ANALYZE"))
+    # Nouvelles connexions : pas de schéma ni de requêtes préparées en cache
+    engine.dispose()
+
+def measure(users: int, repeat: int) -> dict:
+    rng = random.Random(7)
+    results = {}
+    with engine.connect() as connection:
+        for name, sql in QUERIES.items():
+            params = {"user_id": users // 2, "course_id": 1, "departement": "IT"}
+            plan = " | ".join(
+                row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)
+            )
+            timings = []
+            for _ in range(repeat):
+                params["user_id"] = rng.randrange(1, users + 1)
+                begin = time.perf_counter()
+                connection.execute(text(sql), params).fetchall()
+                timings.append((time.perf_counter() - begin) * 1000)
+            results[name] = (plan, statistics.median(timings))
+    return results
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    init_db()
+    seed(args.users, args.rows)
+
+    drop_migrated_indexes()
+    before = measure(args.users, args.repeat)
+    init_db()  # réapplique les migrations
+    engine.dispose()
+    after = measure(args.users, args.repeat)
+
+    for name in QUERIES:
+        plan_before, time_before = before[name]
+        plan_after, time_after = after[name]
+        print(f"{name}: {time_before:.3f} ms -> {time_after:.3f} ms")
+        print(f"    avant : {plan_before}")
+        print(f"    après : {plan_after}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,128 @@
+# Liste des messages à 10k messages par utilisateur : ancienne réponse
+# MessageInDB (objets ORM, sender/receiver complets) contre la projection
+# MessageSummary (un SELECT joint de colonnes, sérialisé sans hydratation).
+#
+#   python benchmarks/bench_message_list.py --messages 10000 --requests 300
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Annotated, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import httpx
+from fastapi import FastAPI, Depends, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import main
+from auth import create_access_token, get_password_hash
+from database import SessionLocal, async_engine, get_async_db
+from models import User, Message
+from pagination import set_next_cursor
+from schemas import MessageInDB
+from services.message_service import get_user_messages_async
+
+def seed(messages: int, senders: int) -> str:
+    db = SessionLocal()
+    hashed_password = get_password_hash("bench")
+    users = [
+        User(nom=f"user{i}", prenom="Bench", departement="IT", role="employer",
+             email=f"user{i}@bench.dz", telephone="0", hashed_password=hashed_password,
+             is_active=True, is_approved=True)
+        for i in range(senders + 1)
+    ]
+    db.add_all(users)
+    db.commit()
+    receiver = users[0]
+    db.bulk_insert_mappings(Message, [
+        {"sender_id": users[1 + i % senders].id, "receiver_id": receiver.id,
+         "content": f"message {i} " + "lorem ipsum " * 10, "is_read": i % 3 == 0}
+        for i in range(messages)
+    ])
+    db.commit()
+    email = receiver.email
+    db.close()
+    return create_access_token({"sub": email})
+
+def build_legacy_app() -> FastAPI:
+    # Reproduit l'ancienne route : objets Message avec sender/receiver imbriqués
+    app = FastAPI()
+
+    @app.get("/messages/", response_model=List[MessageInDB])
+    async def get_messages(
+        response: Response,
+        current_user: Annotated[User, Depends(main.get_current_user)],
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_db)
+    ):
+        messages = await get_user_messages_async(db=db, user_id=current_user.id, limit=limit, cursor=cursor)
+        set_next_cursor(response, messages, limit)
+        return messages
+
+    return app
+
+statements = [0]
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statements(*args):
+    statements[0] += 1
+
+async def measure(app: FastAPI, token: str, requests: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        await client.get("/messages/?limit=100")  # préchauffage
+
+        statements[0] = 0
+        size = 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/messages/?limit=100")
+            response.raise_for_status()
+            size = len(response.content)
+        page_ms = (time.perf_counter() - start) * 1000 / requests
+        page_statements = statements[0] / requests
+
+        # Parcours complet de la boîte de réception par curseur
+        start = time.perf_counter()
+        cursor, pages, rows = None, 0, 0
+        while True:
+            response = await client.get("/messages/", params={"limit": 100, **({"cursor": cursor} if cursor else {})})
+            pages += 1
+            rows += len(response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        walk_s = time.perf_counter() - start
+
+    return {"page_ms": page_ms, "statements": page_statements, "bytes": size,
+            "walk_s": walk_s, "pages": pages, "rows": rows}
+
+async def compare(token: str, requests: int):
+    results = {
+        "MessageInDB (before)": await measure(build_legacy_app(), token, requests),
+        "MessageSummary (after)": await measure(main.app, token, requests),
+    }
+    print(f"{'response':<24}{'ms/page':>10}{'SQL/page':>10}{'KiB/page':>10}{'full walk':>12}")
+    for name, result in results.items():
+        print(f"{name:<24}{result['page_ms']:>10.2f}{result['statements']:>10.1f}"
+              f"{result['bytes'] / 1024:>10.1f}{result['walk_s']:>10.2f} s"
+              f"  ({result['rows']} rows, {result['pages']} pages)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--senders", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    token = seed(args.messages, args.senders)
+    asyncio.run(compare(token, args.requests))
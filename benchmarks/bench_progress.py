@@ -0,0 +1,126 @@
+# Mises à jour de progression du lecteur (PUT /courses/{id}/progress toutes
+# les quelques secondes par apprenant) : écriture immédiate avec une
+# notification par appel, contre le tampon de progression (écritures par lots,
+# notifications aux paliers). Compte les commits, les lignes écrites et les
+# notifications mises en file.
+#
+#   python benchmarks/bench_progress.py --users 200 --rounds 40 --flush-every 2
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import httpx
+from sqlalchemy import event
+
+import main
+from auth import create_access_token, get_password_hash
+from database import SessionLocal, engine
+from models import User, Course, CourseProgress, Job
+from services import progress_service
+from services.progress_service import progress_buffer
+
+def seed(users: int) -> list:
+    db = SessionLocal()
+    hashed_password = get_password_hash("bench")
+    learners = [
+        User(nom=f"user{i}", prenom="Bench", departement="IT", role="employer",
+             email=f"user{i}@bench.dz", telephone="0", hashed_password=hashed_password,
+             is_active=True, is_approved=True)
+        for i in range(users)
+    ]
+    db.add_all(learners)
+    db.flush()
+    courses = [Course(title=f"Cours {i}", description="", instructor_id=learners[0].id, departement="IT")
+               for i in range(2)]
+    db.add_all(courses)
+    db.flush()
+    db.add_all(CourseProgress(user_id=user.id, course_id=course.id, progress=0, status="En cours")
+               for user in learners for course in courses)
+    db.commit()
+    tokens = [create_access_token({"sub": user.email}) for user in learners]
+    db.close()
+    return tokens
+
+counts = {"commits": 0, "rows": 0}
+
+@event.listens_for(engine, "commit")
+def count_commit(connection):
+    counts["commits"] += 1
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_rows(connection, cursor, statement, parameters, context, executemany):
+    if statement.startswith("UPDATE course_progress"):
+        counts["rows"] += len(parameters) if executemany else 1
+
+def reset(db):
+    db.query(CourseProgress).update({
+        CourseProgress.progress: 0, CourseProgress.is_completed: False,
+        CourseProgress.status: "En cours", CourseProgress.completion_date: None
+    })
+    db.query(Job).delete()
+    db.commit()
+
+async def run(tokens: list, rounds: int, flush_every: int, buffered: bool) -> dict:
+    db = SessionLocal()
+    reset(db)
+    # Sans tampon, chaque appel écrit et notifie (comportement précédent)
+    progress_service.PROGRESS_FLUSH_INTERVAL_SECONDS = 10 if buffered else 0
+    progress_service.PROGRESS_NOTIFY_STEP = 25 if buffered else 0
+    counts.update(commits=0, rows=0)
+
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for round_number in range(1, rounds + 1):
+            # Dernier tour : cours terminé, écrit immédiatement
+            value = 100 if round_number == rounds else round(round_number * 99 / rounds, 1)
+            for token in tokens:
+                start = time.perf_counter()
+                response = await client.put(
+                    "/courses/1/progress", params={"progress_value": value},
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+            if buffered and round_number % flush_every == 0:
+                progress_buffer.flush(db)
+        progress_buffer.flush(db)
+
+    notifications = db.query(Job).filter(Job.kind == "notification").count()
+    stored = db.query(CourseProgress).filter(CourseProgress.course_id == 1, CourseProgress.progress == 100).count()
+    db.close()
+    latencies.sort()
+    return {**counts, "notifications": notifications, "requests": len(latencies), "completed": stored,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000}
+
+async def compare(tokens: list, rounds: int, flush_every: int):
+    results = {
+        "write-through (before)": await run(tokens, rounds, flush_every, buffered=False),
+        "buffered (after)": await run(tokens, rounds, flush_every, buffered=True),
+    }
+    print(f"{'mode':<24}{'requests':>10}{'commits':>10}{'rows':>10}{'notifs':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<24}{result['requests']:>10}{result['commits']:>10}{result['rows']:>10}"
+              f"{result['notifications']:>10}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"  ({result['completed']} completed)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=40)
+    # Tours de mises à jour entre deux écritures du tampon (lecteur toutes les
+    # 5 s, PROGRESS_FLUSH_INTERVAL_SECONDS à 10 s : 2)
+    parser.add_argument("--flush-every", type=int, default=2)
+    args = parser.parse_args()
+
+    tokens = seed(args.users)
+    asyncio.run(compare(tokens, args.rounds, args.flush_every))
@@ -0,0 +1,168 @@
+# Charge du canal /events : ouvre des milliers de connexions SSE inactives sur
+# un serveur uvicorn, mesure la mémoire (RSS) du serveur par connexion, puis
+# vérifie la diffusion d'un message, les heartbeats et la reprise Last-Event-ID.
+#
+#   python benchmarks/bench_push.py --connections 5000 --users 500
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("PUSH_HEARTBEAT_SECONDS", "2")
+
+import httpx
+
+from auth import create_access_token, get_password_hash
+from database import SessionLocal, init_db
+from models import User
+
+HOST = "127.0.0.1"
+
+def seed(users: int) -> list:
+    init_db()
+    db = SessionLocal()
+    hashed_password = get_password_hash("bench")
+    db.add_all(
+        User(nom=f"user{i}", prenom="Bench", departement="IT", role="employer",
+             email=f"user{i}@bench.dz", telephone="0", hashed_password=hashed_password,
+             is_active=True, is_approved=True)
+        for i in range(users)
+    )
+    db.commit()
+    accounts = [(user.id, create_access_token({"sub": user.email})) for user in db.query(User).order_by(User.id)]
+    db.close()
+    return accounts
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+class Stream:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.buffer = b""
+        self.event = asyncio.Event()
+
+    async def pump(self):
+        while True:
+            chunk = await self.reader.read(4096)
+            if not chunk:
+                return
+            self.buffer += chunk
+            self.event.set()
+
+    async def wait_for(self, marker: bytes, timeout: float):
+        deadline = time.perf_counter() + timeout
+        while marker not in self.buffer:
+            self.event.clear()
+            await asyncio.wait_for(self.event.wait(), max(deadline - time.perf_counter(), 0.001))
+
+async def open_stream(port: int, token: str, last_event_id: int = None) -> Stream:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    headers = f"GET /events HTTP/1.1\r\nHost: {HOST}\r\nAuthorization: Bearer {token}\r\n"
+    if last_event_id is not None:
+        headers += f"Last-Event-ID: {last_event_id}\r\n"
+    writer.write((headers + "\r\n").encode())
+    await writer.drain()
+    stream = Stream(reader, writer)
+    asyncio.get_running_loop().create_task(stream.pump())
+    await stream.wait_for(b"retry:", 30)
+    return stream
+
+async def run(connections: int, users: int, batch: int):
+    accounts = seed(users)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy()
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://{HOST}:{port}", timeout=30) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/docs")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            # Une connexion et un envoi pour amorcer les imports et les pools
+            warmup = await open_stream(port, accounts[0][1])
+            await client.post("/messages/", data={"content": "warmup", "receiver_id": accounts[0][0]},
+                              headers={"Authorization": f"Bearer {accounts[1][1]}"})
+            await warmup.wait_for(b"event: message", 10)
+            baseline = rss_kib(server.pid)
+            print(f"server RSS, 1 connection: {baseline / 1024:.1f} MiB")
+
+            streams = []
+            started = time.perf_counter()
+            checkpoints = [connections // 2, connections]
+            while len(streams) < connections:
+                size = min(batch, connections - len(streams))
+                streams += await asyncio.gather(*(
+                    open_stream(port, accounts[(len(streams) + i) % users][1]) for i in range(size)
+                ))
+                if len(streams) >= checkpoints[0]:
+                    checkpoints.pop(0)
+                    rss = rss_kib(server.pid)
+                    print(f"server RSS, {len(streams):>6} connections: {rss / 1024:.1f} MiB "
+                          f"({(rss - baseline) / len(streams):.1f} KiB per connection)")
+            print(f"opened {connections} streams in {time.perf_counter() - started:.1f}s")
+
+            # Diffusion : un message vers le premier utilisateur atteint toutes ses connexions
+            receiver_id, _ = accounts[0]
+            receiver_streams = [s for i, s in enumerate(streams) if i % users == 0]
+            started = time.perf_counter()
+            response = await client.post("/messages/", data={"content": "hello", "receiver_id": receiver_id},
+                                         headers={"Authorization": f"Bearer {accounts[1][1]}"})
+            await asyncio.gather(*(s.wait_for(b'"content": "hello"', 10) for s in receiver_streams))
+            print(f"message delivered to {len(receiver_streams)} streams in "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+            # Heartbeats sur des connexions inactives
+            idle = streams[1:connections:max(connections // 20, 1)]
+            await asyncio.gather(*(s.wait_for(b": ping", float(os.environ["PUSH_HEARTBEAT_SECONDS"]) * 3) for s in idle))
+            print(f"heartbeat received on {len(idle)} sampled idle streams")
+
+            # Reprise : un client reconnecté avec l'id précédent reçoit le message manqué
+            marker = receiver_streams[0].buffer.split(b'"content": "hello"')[0]
+            message_event_id = int(marker.rsplit(b"id: ", 1)[1].split(b"\n")[0])
+            resumed = await open_stream(port, accounts[0][1], last_event_id=message_event_id - 1)
+            await resumed.wait_for(b'"content": "hello"', 5)
+            print(f"resume from Last-Event-ID {message_event_id - 1}: replayed message {response.json()['id']}")
+
+            for stream in streams + [warmup, resumed]:
+                stream.writer.close()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    # Deux descripteurs par connexion (client et serveur) sur la même machine
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.connections * 2 + 1024)), hard))
+    asyncio.run(run(args.connections, args.users, args.batch))
@@ -0,0 +1,127 @@
+# Latence de /search sur un corpus de 100k messages (plus cours et supports),
+# comparée à un balayage LIKE équivalent sur les messages de l'utilisateur.
+#
+#   python benchmarks/bench_search.py --messages 100000 --users 1000
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token, get_password_hash
+from database import SessionLocal
+from models import User, Course, CourseMaterial, Message
+from services.search_service import search
+
+random.seed(42)
+COMMON = ["cours", "formation", "module", "session", "planning"]
+RARE = ["cryptographie", "ordonnancement", "thermodynamique", "comptabilité", "ergonomie"]
+FILLER = [f"mot{i}" for i in range(3000)]
+
+def sentence(words: int) -> str:
+    tokens = random.choices(FILLER, k=words)
+    tokens[random.randrange(words)] = random.choice(COMMON)
+    if random.random() < 0.01:
+        tokens[random.randrange(words)] = random.choice(RARE)
+    return " ".join(tokens)
+
+def seed(messages: int, users: int, courses: int):
+    db = SessionLocal()
+    hashed_password = get_password_hash("bench")
+    db.bulk_insert_mappings(User, [
+        {"nom": f"user{i}", "prenom": "Bench", "departement": f"D{i % 10}",
+         "role": "prof" if i % 20 == 0 else "employer", "email": f"user{i}@bench.dz",
+         "telephone": "0", "hashed_password": hashed_password, "is_active": True, "is_approved": True}
+        for i in range(users)
+    ])
+    user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id)]
+    db.bulk_insert_mappings(Course, [
+        {"title": sentence(4), "description": sentence(40), "departement": f"D{i % 10}",
+         "instructor_id": user_ids[(i * 20) % users]}
+        for i in range(courses)
+    ])
+    course_ids = [course_id for (course_id,) in db.query(Course.id)]
+    db.bulk_insert_mappings(CourseMaterial, [
+        {"course_id": random.choice(course_ids), "file_name": f"{sentence(3).replace(' ', '_')}.pdf",
+         "file_path": "x", "file_type": "application/pdf"}
+        for _ in range(courses * 3)
+    ])
+    for start in range(0, messages, 10000):
+        db.bulk_insert_mappings(Message, [
+            {"sender_id": random.choice(user_ids), "receiver_id": random.choice(user_ids),
+             "content": sentence(random.randint(8, 40)), "is_read": False}
+            for _ in range(min(10000, messages - start))
+        ])
+    db.commit()
+    sample = db.query(User).filter(User.role == "employer").limit(50).all()
+    db.expunge_all()
+    db.close()
+    return sample
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def timed(fn, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return percentiles(durations)
+
+def like_scan(db, user, term):
+    # Référence sans index : recherche naïve sur les messages de l'utilisateur
+    return db.query(Message.id)\
+        .filter((Message.sender_id == user.id) | (Message.receiver_id == user.id))\
+        .filter(Message.content.like(f"%{term}%"))\
+        .limit(20).all()
+
+def run(users_sample, runs: int):
+    db = SessionLocal()
+    queries = [
+        ("common term", "formation"),
+        ("rare term", "cryptographie"),
+        ("two terms", "module planning"),
+        ("prefix", "thermo"),
+    ]
+    print(f"{'query':<16}{'FTS p50':>10}{'FTS p95':>10}{'LIKE p50':>10}{'LIKE p95':>10}   (ms, service layer)")
+    for label, q in queries:
+        fts_times, like_times = [], []
+        for user in users_sample:
+            fts_times.append(timed(lambda: search(db, user, q), runs)[0])
+            like_times.append(timed(lambda: like_scan(db, user, q.split()[0]), runs)[0])
+        fts_p50, fts_p95 = percentiles(fts_times)
+        like_p50, like_p95 = percentiles(like_times)
+        print(f"{label:<16}{fts_p50:>10.2f}{fts_p95:>10.2f}{like_p50:>10.2f}{like_p95:>10.2f}")
+    db.close()
+
+    client = TestClient(main.app)
+    token = create_access_token({"sub": users_sample[0].email})
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/search", params={"q": "formation"}, headers=headers)
+    p50, p95 = timed(lambda: client.get("/search", params={"q": "formation"}, headers=headers).raise_for_status(), runs * 10)
+    print(f"GET /search?q=formation end to end: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sample = seed(args.messages, args.users, args.courses)
+    print(f"seeded {args.messages} messages, {args.courses} courses in {time.perf_counter() - start:.1f}s")
+    run(sample, args.runs)
@@ -0,0 +1,134 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "1024"))
+PRINCIPAL_CACHE_DIR = os.getenv("PRINCIPAL_CACHE_DIR", os.path.join("data", "principal_cache"))
+
+def several_workers() -> bool:
+    # uvicorn --workers N démarre chaque worker par multiprocessing ; WEB_CONCURRENCY
+    # est la valeur par défaut de --workers pour uvicorn et gunicorn
+    try:
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            return True
+    except ValueError:
+        pass
+    return multiprocessing.parent_process() is not None
+
+# Versions partagées entre les processus d'une même machine : un fichier par
+# sujet, réécrit à chaque invalidation. Un worker compare la version de son
+# entrée à celle du fichier, et une invalidation faite ailleurs est vue dès
+# la requête suivante.
+class SharedVersions:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, subject: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(subject.encode()).hexdigest())
+
+    def get(self, subject: str) -> int:
+        try:
+            with open(self._path(subject), "rb") as version_file:
+                return int(version_file.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump(self, subject: str):
+        # Horodatage en nanosecondes, écrit atomiquement : pas de
+        # lecture-écriture concurrente entre processus
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(str(time.time_ns()).encode())
+            os.replace(tmp_path, self._path(subject))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+# Cache en mémoire des utilisateurs authentifiés, indexé par le sujet du token (email).
+# Les entrées sont des dictionnaires de colonnes, jamais des objets ORM, afin de
+# pouvoir être rattachées à la session de chaque requête. Avec plusieurs
+# workers, shared_versions propage les invalidations (révocation, suppression)
+# aux autres processus.
+class PrincipalCache:
+    def __init__(self, ttl_seconds: float, max_entries: int, shared_versions: Optional[SharedVersions] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared_versions = shared_versions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, subject: str) -> Optional[dict]:
+        current_version = self.version(subject)
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, version, values = entry
+            if expires_at < time.monotonic() or version != current_version:
+                del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return values
+
+    def version(self, subject: str) -> int:
+        return self.shared_versions.get(subject) if self.shared_versions else 0
+
+    def set(self, subject: str, values: dict, version: int = 0):
+        # version : lue avant le chargement des valeurs, une invalidation
+        # survenue entre-temps rend l'entrée aussitôt périmée
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, version, values)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: str):
+        with self._lock:
+            self._entries.pop(subject, None)
+        if self.shared_versions:
+            self.shared_versions.bump(subject)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "shared": self.shared_versions is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+principal_cache = PrincipalCache(
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    PRINCIPAL_CACHE_MAX_ENTRIES,
+    SharedVersions(PRINCIPAL_CACHE_DIR) if several_workers() else None
+)
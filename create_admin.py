@@ -1,10 +1,10 @@
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, User
+from database import SessionLocal, init_db
+from models import User
 from auth import get_password_hash
-
-# Create all tables
-Base.metadata.create_all(bind=engine)
+from services.user_import_service import ImportFormatError, parse_user_file, import_users
+import argparse
+import sys
 
 def create_admin_user():
     db = SessionLocal()
@@ -38,5 +38,36 @@ def create_admin_user():
     finally:
         db.close()
 
+def import_users_file(path: str, approve: bool) -> bool:
+    try:
+        with open(path, "rb") as file:
+            records = parse_user_file(file.read(), path)
+    except (OSError, ImportFormatError) as e:
+        print(f"Error reading {path}: {str(e)}")
+        return False
+
+    db = SessionLocal()
+    try:
+        result = import_users(db, records, approve)
+    finally:
+        db.close()
+    for error in result["errors"]:
+        print(f"Row {error['row']} ({error['email'] or '-'}): {error['error']}")
+    print(f"{result['created']} user(s) created, {result['failed']} rejected")
+    return result["failed"] == 0
+
+# Passwords are hashed on a "spawn" process pool, which re-imports this
+# script: nothing may run outside the __main__ guard
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the admin account or import users")
+    subcommands = parser.add_subparsers(dest="command")
+    import_parser = subcommands.add_parser("import", help="Import users from a CSV or JSON file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--approve", action="store_true", help="Approve the imported accounts")
+    args = parser.parse_args()
+
+    # Create all tables
+    init_db()
+    if args.command == "import":
+        sys.exit(0 if import_users_file(args.file, args.approve) else 1)
     create_admin_user() 
\ No newline at end of file
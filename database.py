@@ -1,25 +1,189 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError, OperationalError
 from models import Base
+from migrations import run_migrations, schema_lock
 import os
+import threading
+import time
 from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
 
 # Créer le dossier data s'il n'existe pas
 data_dir = Path(__file__).parent / "data"
 data_dir.mkdir(exist_ok=True)
 
 # Utiliser un seul emplacement pour la base de données
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{data_dir}/platform.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{data_dir}/platform.db")
+
+# Profil de production SQLite, appliqué à chaque nouvelle connexion
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Valeur négative = taille en KiB (64 Mo par défaut)
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-64000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "foreign_keys": "ON",
+}
+
+# Dimensionnement du pool de connexions
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool qui mesure le temps d'attente pour obtenir une connexion
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        # Seules les connexions obtenues comptent dans checkouts et l'attente :
+        # un dépassement de pool_timeout n'est compté que dans timeouts
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return connection
+
+def _is_file_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url
+
+engine_options = {}
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    engine_options["connect_args"] = {"check_same_thread": False}
+if not SQLALCHEMY_DATABASE_URL.startswith("sqlite") or _is_file_sqlite(SQLALCHEMY_DATABASE_URL):
+    engine_options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options)
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", apply_sqlite_pragmas)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _add_column(connection, table_name: str, column_name: str, column_type: str) -> bool:
+    try:
+        connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+        return True
+    except OperationalError as error:
+        # Colonne déjà ajoutée (base modifiée hors de init_db)
+        if "duplicate column name" not in str(error):
+            raise
+        return False
+
+def add_missing_columns(connection):
+    # create_all ne modifie pas les tables existantes : ajouter les nouvelles
+    # colonnes (nullables) et leurs index aux bases créées par une version antérieure
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        added = False
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                added = _add_column(connection, table.name, column.name, column_type) or added
+        if added:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+def init_db():
+    # Sous le verrou de schéma, comme chaque migration : les workers qui
+    # démarrent ensemble créent tables et colonnes l'un après l'autre
+    with schema_lock(engine) as connection:
+        Base.metadata.create_all(bind=connection)
+        add_missing_columns(connection)
+    run_migrations(engine)
+
+# Moteur asynchrone (aiosqlite en local, asyncpg pour PostgreSQL)
+def _to_async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _to_async_url(SQLALCHEMY_DATABASE_URL))
+
+async_engine_options = {}
+if not ASYNC_DATABASE_URL.startswith("sqlite") or _is_file_sqlite(ASYNC_DATABASE_URL):
+    async_engine_options.update(
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+# expire_on_commit=False : pas de rechargement implicite (donc d'I/O) après commit
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+def get_pool_metrics() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {"pool": type(pool).__name__}
+    with pool._metrics_lock:
+        checkouts = pool.checkouts
+        return {
+            "pool": type(pool).__name__,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "checkouts": checkouts,
+            "timeouts": pool.timeouts,
+            "avg_wait_ms": pool.total_wait / checkouts * 1000 if checkouts else 0.0,
+            "max_wait_ms": pool.max_wait * 1000
+        }
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,97 @@
+import os
+import re
+import zipfile
+from typing import List
+from xml.etree import ElementTree
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Extraction du texte des supports de cours, page par page. Ce module est
+# exécuté dans les processus du pool d'extraction (services.extraction_service) :
+# il ne dépend ni de la base de données ni de FastAPI.
+EXTRACTION_MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "500"))
+EXTRACTION_MAX_PAGE_CHARS = int(os.getenv("EXTRACTION_MAX_PAGE_CHARS", "20000"))
+
+TEXT_EXTENSIONS = {".txt", ".md", ".csv"}
+DOCX_EXTENSIONS = {".docx"}
+PDF_EXTENSIONS = {".pdf"}
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+class UnsupportedFileType(Exception):
+    pass
+
+def file_kind(file_name: str, file_type: str = None) -> str:
+    extension = os.path.splitext(file_name or "")[1].lower()
+    if extension in PDF_EXTENSIONS or file_type == "application/pdf":
+        return "pdf"
+    if extension in DOCX_EXTENSIONS:
+        return "docx"
+    if extension in TEXT_EXTENSIONS or (file_type or "").startswith("text/"):
+        return "text"
+    return None
+
+def _clean(text: str) -> str:
+    text = text.replace("\x00", "")
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    text = re.sub(r"\n\s*\n+", "\n\n", text)
+    return text.strip()[:EXTRACTION_MAX_PAGE_CHARS]
+
+def _text_pages(path: str) -> List[str]:
+    with open(path, "rb") as source:
+        data = source.read()
+    text = data.decode("utf-8", errors="replace")
+    # Saut de page (form feed) : séparateur de pages des exports texte
+    return text.split("\f")
+
+def _docx_pages(path: str) -> List[str]:
+    # Un .docx est une archive zip : le texte est dans word/document.xml.
+    # Les sauts de page explicites et ceux mémorisés par Word au dernier
+    # rendu (lastRenderedPageBreak) délimitent les pages.
+    pages, paragraphs, runs = [], [], []
+    with zipfile.ZipFile(path) as archive:
+        with archive.open("word/document.xml") as document:
+            for _, element in ElementTree.iterparse(document, events=("end",)):
+                tag = element.tag
+                if tag == f"{_WORD_NS}t":
+                    runs.append(element.text or "")
+                elif tag == f"{_WORD_NS}tab":
+                    runs.append("\t")
+                elif tag == f"{_WORD_NS}p":
+                    paragraphs.append("".join(runs))
+                    runs = []
+                    element.clear()
+                elif tag == f"{_WORD_NS}lastRenderedPageBreak" or (
+                        tag == f"{_WORD_NS}br" and element.get(f"{_WORD_NS}type") == "page"):
+                    paragraphs.append("".join(runs))
+                    runs = []
+                    pages.append("\n".join(paragraphs))
+                    paragraphs = []
+    paragraphs.append("".join(runs))
+    pages.append("\n".join(paragraphs))
+    return pages
+
+def _pdf_pages(path: str) -> List[str]:
+    # Import tardif : seuls les processus d'extraction chargent pypdf
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [page.extract_text() or "" for page in reader.pages[:EXTRACTION_MAX_PAGES]]
+
+_EXTRACTORS = {
+    "text": _text_pages,
+    "docx": _docx_pages,
+    "pdf": _pdf_pages,
+}
+
+def extract_pages(path: str, file_name: str, file_type: str = None) -> List[str]:
+    kind = file_kind(file_name, file_type)
+    if kind is None:
+        raise UnsupportedFileType(f"Unsupported file type: {file_name} ({file_type})")
+    pages = [_clean(page) for page in _EXTRACTORS[kind](path)[:EXTRACTION_MAX_PAGES]]
+    # Les pages vides en fin de document (saut de page final) sont ignorées
+    while pages and not pages[-1]:
+        pages.pop()
+    return pages
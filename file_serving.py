@@ -0,0 +1,159 @@
+import os
+import anyio
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from fastapi import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+# Couche commune de téléchargement des fichiers (supports de cours, pièces
+# jointes) : ETag fort, requêtes conditionnelles (304) et plages d'octets (206).
+FILE_CHUNK_SIZE = 256 * 1024
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+class PartialFileResponse(FileResponse):
+    chunk_size = FILE_CHUNK_SIZE
+
+    def __init__(self, path: str, start: int, end: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.end - self.start + 1
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+                if remaining > 0:
+                    # Fichier tronqué pendant l'envoi
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+def file_etag(stat_result: os.stat_result, sha256: Optional[str] = None) -> str:
+    # L'empreinte du contenu quand elle est connue, sinon date de modification et taille
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Une seule plage est prise en charge ; sinon le fichier entier est renvoyé
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_text, separator, end_text = ranges.strip().partition("-")
+    if not separator:
+        return None
+    try:
+        if start_text == "":
+            # Suffixe : les N derniers octets
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def serve_file(
+    request: Request,
+    path: str,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    sha256: Optional[str] = None
+) -> Response:
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result, sha256)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "accept-ranges": "bytes",
+        "cache-control": "private, no-cache",
+    }
+    
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range : la plage n'est servie que si la ressource n'a pas changé
+    if range_header and (if_range is None or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "content-range": f"bytes */{size}"}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            return PartialFileResponse(
+                path,
+                start,
+                end,
+                headers={
+                    **headers,
+                    "content-range": f"bytes {start}-{end}/{size}",
+                    "content-length": str(end - start + 1),
+                },
+                media_type=media_type,
+                filename=filename,
+                stat_result=stat_result,
+                method=request.method,
+            )
+    
+    response = FileResponse(
+        path,
+        headers=headers,
+        media_type=media_type,
+        filename=filename,
+        stat_result=stat_result,
+        method=request.method,
+    )
+    response.chunk_size = FILE_CHUNK_SIZE
+    return response
\ No newline at end of file
@@ -1,14 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from datetime import timedelta, datetime
+from sqlalchemy.orm import Session, make_transient_to_detached, selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect as sa_inspect, select, func, case, cast, extract, Integer
+from datetime import timedelta, datetime, date
 from typing import Annotated, List, Optional
+from anyio import from_thread
 import json
 import os
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from database import get_db, engine
+from database import get_db, get_async_db, init_db, get_pool_metrics, SessionLocal
 from models.user import User, Base
 from models.course import Course, CourseMaterial, CourseProgress
 from schemas import (
@@ -16,39 +20,103 @@ from schemas import (
     CourseCreate, Course as CourseSchema,
     CourseMaterial as CourseMaterialSchema,
     UserApproval, PendingUser, Notification,
-    MessageCreate, MessageInDB
+    UserImportResult, UserBatchApproval, UserBatchApprovalResult,
+    MessageCreate, MessageInDB, MessageSummary,
+    BatchSelection, MessageBatchDelete, BatchResult,
+    SearchResult, CourseStats as CourseStatsSchema, DepartmentReport
 )
 from auth import (
-    verify_password,
-    get_password_hash,
+    verify_and_update_password,
+    hash_password,
+    HashingPoolSaturated,
     create_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     SECRET_KEY,
     ALGORITHM
 )
 from jose import JWTError, jwt
-from utils import save_uploaded_file
+from cache import principal_cache
+from utils import UploadTooLarge
+from storage import store_upload, release_blob
+from file_serving import serve_file
+from pagination import apply_cursor, set_next_cursor, NEXT_CURSOR_HEADER
+from push import push_hub, event_stream, EventStreamResponse
+from response_cache import (
+    response_cache,
+    cached_json_response,
+    conditional_json_response,
+    render_json,
+    cache_scope,
+    course_tags
+)
+from services.course_service import get_course as get_visible_course
 from services.notification_service import (
     notify_course_created,
     notify_course_deleted,
     notify_material_added,
-    notify_course_progress,
-    get_user_notifications,
-    mark_notification_as_read
+    get_user_notifications_async,
+    mark_notification_as_read_async,
+    mark_notifications_as_read_async
+)
+from services.search_service import search as search_content, SEARCH_KINDS
+from services.extraction_service import extraction_pool, schedule_extraction
+from services.progress_service import (
+    progress_buffer,
+    current_progress,
+    update_progress,
+    start_progress_flusher,
+    stop_progress_flusher
+)
+from services.report_service import get_department_report, start_report_rollups, stop_report_rollups
+from services.user_import_service import (
+    IMPORT_MAX_FILE_BYTES,
+    ImportFormatError,
+    parse_user_file,
+    import_users,
+    set_approval
+)
+from services.export_service import EXPORT_FORMATS, progress_export_query, users_export_query, stream_export
+from services.stats_service import (
+    adjust_course_stats,
+    rebuild_course_stats,
+    get_course_stats,
+    get_course_stats_many
 )
+from services.job_queue import start_job_worker, stop_job_worker, get_queue_stats, enqueue_job
+from services.counter_service import get_unread_counts_async
 from services.message_service import (
-    create_message,
-    get_user_messages,
-    get_message,
-    mark_message_as_read,
-    delete_message
+    create_message_async,
+    get_message_summaries_async,
+    get_message_async,
+    mark_message_as_read_async,
+    mark_messages_as_read_async,
+    delete_message_async,
+    delete_messages_async
 )
 
 # Create database tables
-Base.metadata.create_all(bind=engine)
+init_db()
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def startup():
+    # Background delivery of queued notifications
+    start_job_worker()
+    # Periodic write of buffered course progress
+    start_progress_flusher()
+    # Daily per-department rollups for the admin reports
+    start_report_rollups()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # End open event streams so the server can stop
+    push_hub.close_all()
+    await stop_job_worker()
+    await stop_progress_flusher()
+    await stop_report_rollups()
+    extraction_pool.close()
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -56,19 +124,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request, exc: UploadTooLarge):
+    return JSONResponse(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        content={"detail": str(exc)},
+    )
+
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication service is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
 
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
+def get_principal(db: Session, email: str):
+    # Rattacher l'utilisateur mis en cache à la session courante sans requête SQL
+    cached = principal_cache.get(email)
+    if cached is not None:
+        user = User(**cached)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    version = principal_cache.version(email)
+    user = get_user_by_email(db, email=email)
+    if user is not None:
+        principal_cache.set(email, {
+            column.key: getattr(user, column.key)
+            for column in sa_inspect(User).column_attrs
+        }, version)
+    return user
+
 def authenticate_user(db: Session, email: str, password: str):
+    # Called from sync routes (worker thread): the DB calls stay off the event
+    # loop, and bcrypt runs on the bounded hashing pool through the loop
     user = get_user_by_email(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = from_thread.run(verify_and_update_password, password, user.hashed_password)
+    if not verified:
         return False
+    # Transparent rehash when the stored hash uses a deprecated scheme or cost
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+        principal_cache.invalidate(user.email)
     return user
 
 async def get_current_user(
@@ -87,9 +197,15 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user_by_email(db, email=email)
+    user = get_principal(db, email=email)
     if user is None:
         raise credentials_exception
+    # A revoked account is rejected even if its token has not expired yet
+    if not user.is_approved:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account not approved",
+        )
     return user
 
 # Middleware to check if user is a professor
@@ -118,7 +234,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = from_thread.run(hash_password, user.password)
     db_user = User(
         nom=user.nom,
         prenom=user.prenom,
@@ -176,8 +292,47 @@ def approve_user(
     user.is_approved = approval.is_approved
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(user.email)
     return user
 
+@app.post("/admin/approve-users", response_model=UserBatchApprovalResult)
+def approve_users(
+    approval: UserBatchApproval,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can approve users"
+        )
+    
+    # One UPDATE for the whole list; unknown ids are reported, not fatal
+    return set_approval(db, approval.ids, approval.is_approved)
+
+@app.post("/admin/import-users", response_model=UserImportResult)
+def import_users_file(
+    current_user: Annotated[User, Depends(get_current_user)],
+    file: UploadFile = File(...),
+    approve: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can import users"
+        )
+    
+    content = file.file.read(IMPORT_MAX_FILE_BYTES + 1)
+    if len(content) > IMPORT_MAX_FILE_BYTES:
+        raise UploadTooLarge(IMPORT_MAX_FILE_BYTES)
+    try:
+        records = parse_user_file(content, file.filename)
+    except ImportFormatError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    # Passwords are hashed on a process pool; invalid rows are reported per row
+    return import_users(db, records, approve)
+
 
 @app.delete("/admin/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_user(
@@ -207,14 +362,130 @@ def delete_user(
             detail="Admin cannot delete their own account"
         )
     
-    # Delete the user
+    # Delete the user; their enrollments no longer count in the course statistics
+    email = user.email
+    role = user.role
+    enrolled_course_ids = [row.course_id for row in db.query(CourseProgress.course_id).filter(
+        CourseProgress.user_id == user.id,
+        CourseProgress.course_id != None
+    )]
     db.delete(user)
+    db.flush()
+    if enrolled_course_ids:
+        rebuild_course_stats(db, enrolled_course_ids)
     db.commit()
+    principal_cache.invalidate(email)
+    if role == "prof":
+        # Cached course listings embed the instructor
+        response_cache.invalidate("courses")
     return None
 
+@app.get("/admin/metrics")
+def get_metrics(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can view metrics"
+        )
+    
+    return {
+        "principal_cache": principal_cache.stats(),
+        "database_pool": get_pool_metrics(),
+        "job_queue": get_queue_stats(db),
+        "push": push_hub.stats(),
+        "response_cache": response_cache.stats(),
+        "extraction": extraction_pool.stats(),
+        "progress_buffer": progress_buffer.stats()
+    }
+
+
+@app.get("/admin/reports/departments", response_model=DepartmentReport)
+def department_report(
+    current_user: Annotated[User, Depends(get_current_user)],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can view reports"
+        )
+    
+    # Last 30 days by default; read from the daily rollups, not from course_progress
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return get_department_report(db, start, end)
+
+def _export_response(query, export_format: str, name: str) -> StreamingResponse:
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    filename = f"{name}-{datetime.utcnow():%Y%m%d}.{export_format}"
+    return StreamingResponse(
+        stream_export(query, export_format),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/admin/export/progress")
+def export_progress(
+    current_user: Annotated[User, Depends(get_current_user)],
+    format: str = "csv",
+    departement: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    completed: Optional[bool] = None,
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can export data"
+        )
+    
+    # Buffered progress updates are written first so the export is current
+    progress_buffer.flush(db)
+    return _export_response(progress_export_query(departement, start, end, completed), format, "progress")
+
+@app.get("/admin/export/users")
+def export_users(
+    current_user: Annotated[User, Depends(get_current_user)],
+    format: str = "csv",
+    departement: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can export data"
+        )
+    
+    return _export_response(users_export_query(departement, start, end), format, "users")
+
+@app.post("/admin/counters/reconcile", status_code=status.HTTP_202_ACCEPTED)
+def reconcile_counters(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin can reconcile counters"
+        )
+    
+    # Rebuilt from the notifications and messages tables by the job worker
+    job = enqueue_job(db, "reconcile_unread_counters", {})
+    return {"message": "Counter reconciliation queued", "job_id": job.id}
+
 
 @app.post("/token", response_model=Token)
-async def login_for_access_token(
+def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Session = Depends(get_db)
 ):
@@ -239,26 +510,84 @@ async def login_for_access_token(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+def _completion_days(dialect_name: str):
+    # Whole days from enrollment to completion, like timedelta.days
+    if dialect_name == "postgresql":
+        seconds = extract("epoch", CourseProgress.completion_date - CourseProgress.start_date)
+        return func.floor(seconds / 86400)
+    return cast(
+        func.julianday(CourseProgress.completion_date) - func.julianday(CourseProgress.start_date),
+        Integer
+    )
+
 @app.get("/users/me")
 async def read_users_me(
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    skip: int = 0,
+    limit: int = 100
 ):
-    # Get user's course progress
-    progress_records = db.query(CourseProgress).filter(
-        CourseProgress.user_id == current_user.id
-    ).all()
+    # Calculate statistics in a single aggregate query
+    total_courses, completed_courses, progress_sum, avg_completion_time = db.query(
+        func.count(CourseProgress.id),
+        func.coalesce(func.sum(case((CourseProgress.is_completed == True, 1), else_=0)), 0),
+        func.coalesce(func.sum(CourseProgress.progress), 0),
+        func.coalesce(
+            func.avg(case(
+                (
+                    (CourseProgress.is_completed == True) & (CourseProgress.completion_date != None),
+                    _completion_days(db.bind.dialect.name)
+                ),
+                else_=None
+            )),
+            0
+        )
+    ).filter(CourseProgress.user_id == current_user.id).one()
     
-    # Calculate statistics
-    total_courses = len(progress_records)
-    completed_courses = sum(1 for p in progress_records if p.is_completed)
-    average_progress = sum(p.progress for p in progress_records) / total_courses if total_courses > 0 else 0
+    # Same values as /courses/{course_id}/progress: add the updates still
+    # waiting in the write buffer
+    progress_columns = (
+        CourseProgress.user_id,
+        CourseProgress.course_id,
+        CourseProgress.progress,
+        CourseProgress.last_accessed,
+        CourseProgress.is_completed
+    )
+    buffered_course_ids = progress_buffer.course_ids(current_user.id)
+    if buffered_course_ids:
+        for progress in db.query(*progress_columns).filter(
+            CourseProgress.user_id == current_user.id,
+            CourseProgress.course_id.in_(buffered_course_ids)
+        ):
+            value, _ = current_progress(progress)
+            progress_sum += value - (progress.progress or 0)
+    average_progress = progress_sum / total_courses if total_courses else 0
     
-    # Calculate average completion time for completed courses
-    completion_times = [(p.completion_date - p.start_date).days 
-                       for p in progress_records 
-                       if p.is_completed and p.completion_date]
-    avg_completion_time = sum(completion_times) / len(completion_times) if completion_times else 0
+    # Get one page of the user's courses with their titles in a single joined query
+    progress_records = db.query(
+        Course.title,
+        *progress_columns,
+        CourseProgress.start_date,
+        CourseProgress.completion_date,
+        CourseProgress.status
+    ).outerjoin(Course, Course.id == CourseProgress.course_id)\
+        .filter(CourseProgress.user_id == current_user.id)\
+        .order_by(CourseProgress.id)\
+        .offset(skip)\
+        .limit(limit)\
+        .all()
+    courses = []
+    for progress in progress_records:
+        value, last_accessed = current_progress(progress)
+        courses.append({
+            "nom_du_cours": progress.title,
+            "progres": f"{value:.1f}%",
+            "date_debut": progress.start_date.strftime("%d/%m/%Y"),
+            "date_fin": progress.completion_date.strftime("%d/%m/%Y") if progress.completion_date else "En cours...",
+            "dernier_acces": last_accessed.strftime("%d/%m/%Y %H:%M"),
+            "statut": progress.status,
+            "duree": f"{(datetime.utcnow() - progress.start_date).days} jours"
+        })
     
     return {
         "profile": {
@@ -275,18 +604,7 @@ async def read_users_me(
             "progression_moyenne": f"{average_progress:.1f}%",
             "temps_moyen_completion": f"{avg_completion_time:.1f} jours"
         },
-        "courses": [
-            {
-                "nom_du_cours": progress.course.title,
-                "progres": f"{progress.progress:.1f}%",
-                "date_debut": progress.start_date.strftime("%d/%m/%Y"),
-                "date_fin": progress.completion_date.strftime("%d/%m/%Y") if progress.completion_date else "En cours...",
-                "dernier_acces": progress.last_accessed.strftime("%d/%m/%Y %H:%M"),
-                "statut": progress.status,
-                "duree": f"{(datetime.utcnow() - progress.start_date).days} jours"
-            }
-            for progress in progress_records
-        ]
+        "courses": courses
     }
 
 # Course endpoints
@@ -304,6 +622,7 @@ def create_course(
     db.add(db_course)
     db.commit()
     db.refresh(db_course)
+    response_cache.invalidate(*course_tags(db_course.id))
     
     # Notify admin about new course
     notify_course_created(db, db_course)
@@ -312,22 +631,37 @@ def create_course(
 
 @app.get("/courses/", response_model=List[CourseSchema])
 def get_courses(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    courses = db.query(Course).offset(skip).limit(limit).all()
-    return courses
+    def build(response: Response):
+        # Keyset pagination: pass the X-Next-Cursor header back as ?cursor=.
+        # Oldest first, the insertion order offset callers have always received.
+        courses = apply_cursor(db.query(Course), Course.created_at, Course.id, cursor, descending=False)\
+            .offset(skip)\
+            .limit(limit)\
+            .all()
+        set_next_cursor(response, courses, limit)
+        return courses
+    
+    return cached_json_response(request, cache_scope(None), ("courses",), build, List[CourseSchema])
 
 @app.get("/courses/{course_id}", response_model=CourseSchema)
 def get_course(
     course_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-    return course
+    def build(response: Response):
+        course = db.query(Course).filter(Course.id == course_id).first()
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return course
+    
+    return cached_json_response(request, cache_scope(None), course_tags(course_id), build, CourseSchema)
 
 @app.post("/courses/{course_id}/materials/", response_model=CourseMaterialSchema)
 def upload_course_material(
@@ -346,19 +680,24 @@ def upload_course_material(
             detail="You can only upload materials to your own courses"
         )
     
-    # Save the file
-    file_path = save_uploaded_file(file, course_id)
+    # Save the file (deduplicated by content)
+    stored_file = store_upload(db, file)
     
     # Create course material record
     db_material = CourseMaterial(
         course_id=course_id,
         file_name=file.filename,
-        file_path=file_path,
-        file_type=file.content_type
+        file_path=stored_file.path,
+        file_type=file.content_type,
+        file_size=stored_file.size,
+        sha256=stored_file.sha256
     )
     db.add(db_material)
+    # Text is extracted in the background, then indexed for search
+    schedule_extraction(db, db_material)
     db.commit()
     db.refresh(db_material)
+    response_cache.invalidate(*course_tags(course_id))
     
     # Notify admin and students about new material
     notify_material_added(db, course, db_material)
@@ -368,12 +707,52 @@ def upload_course_material(
 @app.get("/courses/{course_id}/materials/", response_model=List[CourseMaterialSchema])
 def get_course_materials(
     course_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    course = db.query(Course).filter(Course.id == course_id).first()
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-    return course.materials
+    def build(response: Response):
+        course = db.query(Course).filter(Course.id == course_id).first()
+        if course is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return course.materials
+    
+    return cached_json_response(
+        request, cache_scope(None), course_tags(course_id), build, List[CourseMaterialSchema]
+    )
+
+@app.get("/courses/{course_id}/materials/{material_id}/download")
+def download_course_material(
+    course_id: int,
+    material_id: int,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    material = db.query(CourseMaterial).filter(
+        CourseMaterial.id == material_id,
+        CourseMaterial.course_id == course_id
+    ).first()
+    if material is None or not material.file_path or not os.path.exists(material.file_path):
+        raise HTTPException(status_code=404, detail="Course material not found")
+    
+    # Course visible for the user's role/department, or the user is enrolled in it
+    enrolled = db.query(CourseProgress.id).filter(
+        CourseProgress.user_id == current_user.id,
+        CourseProgress.course_id == course_id
+    ).first() is not None
+    if not enrolled and get_visible_course(db, course_id, current_user) is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have access to this course"
+        )
+    
+    return serve_file(
+        request,
+        material.file_path,
+        media_type=material.file_type,
+        filename=material.file_name,
+        sha256=material.sha256
+    )
 
 @app.post("/courses/{course_id}/enroll")
 async def enroll_in_course(
@@ -406,7 +785,13 @@ async def enroll_in_course(
     )
     
     db.add(progress)
-    db.commit()
+    adjust_course_stats(db, course_id, enrolled=1)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Concurrent enrollment caught by the unique (user_id, course_id) index
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Already enrolled in this course")
     db.refresh(progress)
     
     return {
@@ -433,11 +818,21 @@ async def mark_course_as_completed(
     if not progress:
         raise HTTPException(status_code=404, detail="Not enrolled in this course")
     
-    # Mark course as completed
+    # Mark course as completed; a buffered partial progress must not overwrite it
+    progress_buffer.discard(current_user.id, course_id)
+    adjust_course_stats(
+        db,
+        course_id,
+        completed=0 if progress.is_completed else 1,
+        progress=100 - (progress.progress or 0)
+    )
+    now = datetime.utcnow()
     progress.is_completed = True
     progress.status = "Terminé"
-    progress.completion_date = datetime.utcnow()
+    progress.completion_date = now
     progress.progress = 100
+    # Newer than any buffered value, including another worker's
+    progress.last_accessed = now
     
     db.commit()
     db.refresh(progress)
@@ -451,6 +846,24 @@ async def mark_course_as_completed(
         }
     }
 
+@app.get("/courses/{course_id}/stats", response_model=CourseStatsSchema)
+def get_course_statistics(
+    course_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    course = db.query(Course).filter(Course.id == course_id).first()
+    if course is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if current_user.role != "admin" and course.instructor_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the course instructor or an admin can view its statistics"
+        )
+    
+    # Read from the course_stats summary row, not by scanning course_progress
+    return get_course_stats(db, course_id)
+
 @app.get("/courses/{course_id}/progress")
 async def get_course_progress(
     course_id: int,
@@ -465,13 +878,15 @@ async def get_course_progress(
     if not progress:
         raise HTTPException(status_code=404, detail="Not enrolled in this course")
     
+    # Include an update still waiting in the write buffer
+    value, last_accessed = current_progress(progress)
     return {
         "course_details": {
             "title": progress.course.title,
             "enrollment_date": progress.start_date.strftime("%d/%m/%Y"),
-            "last_accessed": progress.last_accessed.strftime("%d/%m/%Y %H:%M"),
+            "last_accessed": last_accessed.strftime("%d/%m/%Y %H:%M"),
             "completion_date": progress.completion_date.strftime("%d/%m/%Y") if progress.completion_date else None,
-            "progress": f"{progress.progress:.1f}%",
+            "progress": f"{value:.1f}%",
             "status": progress.status,
             "duration": f"{(datetime.utcnow() - progress.start_date).days} jours"
         }
@@ -484,36 +899,25 @@ async def update_course_progress(
     current_user: Annotated[User, Depends(get_current_user)],
     db: Session = Depends(get_db)
 ):
-    # Get progress record
-    progress = db.query(CourseProgress).filter(
+    # Get progress record and its course in one query
+    progress = db.query(CourseProgress).options(joinedload(CourseProgress.course)).filter(
         CourseProgress.user_id == current_user.id,
         CourseProgress.course_id == course_id
     ).first()
     
     if not progress:
         raise HTTPException(status_code=404, detail="Not enrolled in this course")
+    course_title = progress.course.title
     
-    # Update progress
-    progress.progress = min(100, max(0, progress_value))  # Ensure progress is between 0 and 100
-    progress.last_accessed = datetime.utcnow()
-    
-    # Automatically mark as completed if progress reaches 100%
-    if progress.progress >= 100 and not progress.is_completed:
-        progress.is_completed = True
-        progress.status = "Terminé"
-        progress.completion_date = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(progress)
-    
-    # Notify student about progress update
-    notify_course_progress(db, current_user.id, progress.course, progress.progress)
+    # Buffered and written in batches; completion (100%) is written immediately
+    # and the student is notified at progress thresholds only
+    value, last_updated = update_progress(db, progress, progress.course, progress_value)
     
     return {
-        "course_title": progress.course.title,
-        "current_progress": f"{progress.progress:.1f}%",
+        "course_title": course_title,
+        "current_progress": f"{value:.1f}%",
         "status": progress.status,
-        "last_updated": progress.last_accessed.strftime("%d/%m/%Y %H:%M")
+        "last_updated": last_updated.strftime("%d/%m/%Y %H:%M")
     }
 
 # Dashboard routes
@@ -567,8 +971,13 @@ async def prof_dashboard(
             detail="Access denied. professor role required."
         )
     
-    # Get professor's courses and materials
-    courses = db.query(Course).filter(Course.instructor_id == current_user.id).all()
+    # Get professor's courses and materials (materials loaded in one extra query)
+    courses = db.query(Course)\
+        .options(selectinload(Course.materials))\
+        .filter(Course.instructor_id == current_user.id)\
+        .all()
+    # Enrollment and completion figures from the course_stats summary table
+    stats = get_course_stats_many(db, [course.id for course in courses])
     
     return {
         "user_info": {
@@ -583,6 +992,10 @@ async def prof_dashboard(
                 "title": course.title,
                 "description": course.description,
                 "created_at": course.created_at.isoformat() if course.created_at else None,
+                "enrolled": stats[course.id]["enrolled"],
+                "completed": stats[course.id]["completed"],
+                "completion_rate": stats[course.id]["completion_rate"],
+                "average_progress": stats[course.id]["average_progress"],
                 "materials": [
                     {
                         "id": material.id,
@@ -599,6 +1012,7 @@ async def prof_dashboard(
 
 @app.get("/dashboard/employer")
 async def employer_dashboard(
+    request: Request,
     current_user: Annotated[User, Depends(get_current_user)],
     db: Session = Depends(get_db)
 ):
@@ -608,17 +1022,16 @@ async def employer_dashboard(
             detail="Access denied. employer role required."
         )
     
-    # Get all available courses
-    courses = db.query(Course).all()
-    
-    return {
-        "user_info": {
-            "nom": current_user.nom,
-            "prenom": current_user.prenom,
-            "email": current_user.email,
-            "departement": current_user.departement
-        },
-        "available_courses": [
+    def build_courses():
+        # Get all available courses with their instructor and materials count in one query
+        materials_count = select(func.count(CourseMaterial.id))\
+            .where(CourseMaterial.course_id == Course.id)\
+            .correlate(Course)\
+            .scalar_subquery()
+        courses = db.query(Course, materials_count.label("materials_count"))\
+            .options(joinedload(Course.instructor))\
+            .all()
+        return render_json([
             {
                 "id": course.id,
                 "title": course.title,
@@ -627,11 +1040,23 @@ async def employer_dashboard(
                     "nom": course.instructor.nom,
                     "prenom": course.instructor.prenom
                 },
-                "materials_count": len(course.materials)
+                "materials_count": materials_count
             }
-            for course in courses
-        ]
-    }
+            for course, materials_count in courses
+        ]), {}
+    
+    # The course list is shared by every employer of the department; only user_info is per user
+    courses = response_cache.get_or_build(
+        f"{cache_scope(current_user)}|dashboard/employer:courses", ("courses",), build_courses
+    )
+    user_info = render_json({
+        "nom": current_user.nom,
+        "prenom": current_user.prenom,
+        "email": current_user.email,
+        "departement": current_user.departement
+    })
+    body = b'{"user_info":' + user_info + b',"available_courses":' + courses.body + b'}'
+    return conditional_json_response(request, body)
 
 @app.put("/courses/{course_id}")
 def update_course(
@@ -659,6 +1084,7 @@ def update_course(
     
     db.commit()
     db.refresh(db_course)
+    response_cache.invalidate(*course_tags(course_id))
     return db_course
 
 @app.delete("/courses/{course_id}")
@@ -682,9 +1108,16 @@ def delete_course(
     # Notify admin about course deletion
     notify_course_deleted(db, course)
     
+    # Delete the materials with the course and release their files (removed after commit)
+    for material in course.materials:
+        if material.sha256:
+            release_blob(db, material.sha256)
+        db.delete(material)
+    
     # Delete the course
     db.delete(course)
     db.commit()
+    response_cache.invalidate(*course_tags(course_id))
     return {"message": "Course deleted successfully"}
 
 @app.delete("/courses/{course_id}/materials/{material_id}")
@@ -710,45 +1143,154 @@ def delete_course_material(
             detail="You can only delete materials from your own courses"
         )
     
-    # Delete the material
+    # Delete the material and release its file
+    if material.sha256:
+        release_blob(db, material.sha256)
     db.delete(material)
     db.commit()
+    response_cache.invalidate(*course_tags(course_id))
     return {"message": "Course material deleted successfully"}
 
+@app.post(
+    "/courses/{course_id}/materials/{material_id}/extract",
+    response_model=CourseMaterialSchema,
+    status_code=status.HTTP_202_ACCEPTED
+)
+def extract_course_material(
+    course_id: int,
+    material_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Session = Depends(get_db)
+):
+    material = db.query(CourseMaterial).filter(
+        CourseMaterial.id == material_id,
+        CourseMaterial.course_id == course_id
+    ).first()
+    if material is None:
+        raise HTTPException(status_code=404, detail="Course material not found")
+    if current_user.role != "admin" and material.course.instructor_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only re-extract materials from your own courses"
+        )
+    
+    # Queue a new extraction, e.g. after a failure or a parser upgrade
+    schedule_extraction(db, material)
+    db.commit()
+    db.refresh(material)
+    response_cache.invalidate(*course_tags(course_id))
+    return material
+
+@app.get("/search", response_model=List[SearchResult])
+def search(
+    q: str,
+    current_user: Annotated[User, Depends(get_current_user)],
+    types: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    # types: comma-separated subset of course, material, message
+    kinds = [kind.strip() for kind in types.split(",")] if types else list(SEARCH_KINDS)
+    if not kinds or any(kind not in SEARCH_KINDS for kind in kinds):
+        raise HTTPException(status_code=400, detail="Invalid search type")
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 100")
+    
+    # Courses and materials follow the course visibility rules, messages are the user's own
+    return search_content(db, current_user, q, kinds, skip, limit)
+
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    token: Annotated[Optional[str], Depends(optional_oauth2_scheme)],
+    access_token: Optional[str] = None,
+    last_event_id: Optional[str] = None
+):
+    # EventSource cannot set headers: the token may also be passed as ?access_token=.
+    # Authentication uses its own short session so an open stream holds no pooled connection.
+    with SessionLocal() as db:
+        user = await get_current_user(token or access_token or "", db)
+        user_id = user.id
+    
+    # Resume after the last event the client received
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    # The stream subscribes when it starts, so a client gone before the first chunk holds no slot
+    if not push_hub.has_capacity():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open event streams",
+            headers={"Retry-After": "5"}
+        )
+    
+    return EventStreamResponse(
+        event_stream(user_id, last_event_id),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/notifications/unread-count")
+async def get_unread_notification_count(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    counts = await get_unread_counts_async(db, current_user.id)
+    return {"unread_count": counts["notifications"]}
+
 @app.get("/notifications/", response_model=List[Notification])
-def get_notifications(
+async def get_notifications(
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ):
-    return get_user_notifications(db, current_user.id, skip, limit)
+    notifications = await get_user_notifications_async(db, current_user.id, skip, limit, cursor)
+    set_next_cursor(response, notifications, limit)
+    return notifications
 
 @app.put("/notifications/{notification_id}/read")
-def mark_notification_read(
+async def mark_notification_read(
     notification_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    notification = mark_notification_as_read(db, notification_id, current_user.id)
+    notification = await mark_notification_as_read_async(db, notification_id, current_user.id)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     return {"message": "Notification marked as read"}
 
+@app.post("/notifications/read", response_model=BatchResult)
+async def mark_notifications_read(
+    selection: BatchSelection,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    # One UPDATE for the whole selection
+    count = await mark_notifications_as_read_async(
+        db, current_user.id, ids=selection.ids, up_to_id=selection.up_to_id
+    )
+    return {"count": count}
+
 @app.post("/messages/", response_model=MessageInDB)
 async def send_message(
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     content: str = Form(...),
     receiver_id: int = Form(...),
     file: Optional[UploadFile] = File(None)
 ):
     # Verify receiver exists
-    receiver = db.query(User).filter(User.id == receiver_id).first()
+    receiver = await db.get(User, receiver_id)
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
     
-    return create_message(
+    return await create_message_async(
         db=db,
         sender_id=current_user.id,
         receiver_id=receiver_id,
@@ -756,72 +1298,119 @@ async def send_message(
         file=file
     )
 
-@app.get("/messages/", response_model=List[MessageInDB])
-def get_messages(
+@app.get("/messages/unread-count")
+async def get_unread_message_count(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    counts = await get_unread_counts_async(db, current_user.id)
+    return {"unread_count": counts["messages"]}
+
+@app.get("/messages/", response_model=List[MessageSummary])
+async def get_messages(
     current_user: Annotated[User, Depends(get_current_user)],
     message_type: str = "received",
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     if message_type not in ["received", "sent"]:
         raise HTTPException(status_code=400, detail="Invalid message type")
     
-    return get_user_messages(
+    # Rows are serialised directly; the full message with sender/receiver is at /messages/{message_id}
+    messages = await get_message_summaries_async(
         db=db,
         user_id=current_user.id,
         message_type=message_type,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
+    response = Response(render_json(messages, List[MessageSummary]), media_type="application/json")
+    set_next_cursor(response, messages, limit)
+    return response
 
 @app.get("/messages/{message_id}", response_model=MessageInDB)
-def read_message(
+async def read_message(
     message_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    message = get_message(db, message_id, current_user.id)
+    message = await get_message_async(db, message_id, current_user.id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     return message
 
 @app.put("/messages/{message_id}/read")
-def mark_message_read(
+async def mark_message_read(
     message_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    message = mark_message_as_read(db, message_id, current_user.id)
+    message = await mark_message_as_read_async(db, message_id, current_user.id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     return {"message": "Message marked as read"}
 
+@app.post("/messages/read", response_model=BatchResult)
+async def mark_messages_read(
+    selection: BatchSelection,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    count = await mark_messages_as_read_async(
+        db, current_user.id, ids=selection.ids, up_to_id=selection.up_to_id
+    )
+    return {"count": count}
+
+@app.post("/messages/delete", response_model=BatchResult)
+async def remove_messages(
+    selection: MessageBatchDelete,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    if selection.message_type not in [None, "received", "sent"]:
+        raise HTTPException(status_code=400, detail="Invalid message type")
+    
+    # Attachments are released afterwards by the job worker
+    count = await delete_messages_async(
+        db,
+        current_user.id,
+        message_type=selection.message_type,
+        ids=selection.ids,
+        up_to_id=selection.up_to_id
+    )
+    return {"count": count}
+
 @app.delete("/messages/{message_id}")
-def remove_message(
+async def remove_message(
     message_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not delete_message(db, message_id, current_user.id):
+    if not await delete_message_async(db, message_id, current_user.id):
         raise HTTPException(status_code=404, detail="Message not found")
     return {"message": "Message deleted successfully"}
 
 @app.get("/messages/file/{message_id}")
 async def get_message_file(
     message_id: int,
+    request: Request,
     current_user: Annotated[User, Depends(get_current_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    message = get_message(db, message_id, current_user.id)
+    message = await get_message_async(db, message_id, current_user.id)
     if not message or not message.file_path:
         raise HTTPException(status_code=404, detail="File not found")
     
     if not os.path.exists(message.file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(
+    return serve_file(
+        request,
         message.file_path,
         media_type=message.file_type,
-        filename=os.path.basename(message.file_path)
+        filename=message.file_name or os.path.basename(message.file_path),
+        sha256=message.sha256
     )
@@ -0,0 +1,214 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, NamedTuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+import os
+import time
+
+# Migrations de schéma versionnées. create_all crée les tables manquantes et
+# add_missing_columns les colonnes nouvelles ; tout le reste (index, contraintes,
+# corrections de données) passe par une migration numérotée, appliquée une
+# seule fois et enregistrée dans la table schema_migrations.
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str):
+    def decorator(upgrade):
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        return upgrade
+    return decorator
+
+# Index correspondant aux requêtes du code (filtre + tri), aussi déclarés sur
+# les modèles pour les bases neuves
+QUERY_INDEXES = [
+    ("ix_notifications_user_id_created_at", "notifications", "user_id, created_at"),
+    ("ix_messages_receiver_id_created_at", "messages", "receiver_id, created_at"),
+    ("ix_messages_sender_id_created_at", "messages", "sender_id, created_at"),
+    ("ix_course_progress_course_id", "course_progress", "course_id"),
+    ("ix_courses_instructor_id", "courses", "instructor_id"),
+    ("ix_courses_departement_created_at", "courses", "departement, created_at"),
+    ("ix_courses_created_at", "courses", "created_at"),
+    ("ix_users_is_approved", "users", "is_approved"),
+]
+
+@migration(1, "Composite indexes for the service layer query shapes")
+def add_query_indexes(connection: Connection):
+    for name, table, columns in QUERY_INDEXES:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+@migration(2, "Unique (user_id, course_id) on course_progress")
+def add_course_progress_unique(connection: Connection):
+    # Conserver l'inscription la plus avancée quand un doublon existe
+    connection.execute(text("""
+        DELETE FROM course_progress
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, course_id
+                    ORDER BY is_completed DESC, progress DESC, id
+                ) AS position
+                FROM course_progress
+            )
+            WHERE position > 1
+        )
+    """))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_course_progress_user_id_course_id "
+        "ON course_progress (user_id, course_id)"
+    ))
+
+@migration(3, "Initial unread counters")
+def populate_unread_counters(connection: Connection):
+    # Import tardif : services dépend de database, qui importe ce module
+    from services.counter_service import rebuild_unread_counters
+    rebuild_unread_counters(connection)
+
+# Index plein texte FTS5 en contenu externe : le texte reste dans la table
+# source, les triggers tiennent l'index à jour à chaque écriture
+FTS_TABLES = [
+    ("courses_fts", "courses", ["title", "description"]),
+    ("course_materials_fts", "course_materials", ["file_name"]),
+    ("messages_fts", "messages", ["content"]),
+]
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+
+def create_fts_table(connection: Connection, name: str, content: str, columns: List[str]):
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{column_list}, content='{content}', content_rowid='id', "
+        f"tokenize='{FTS_TOKENIZE}', prefix='2 3')"
+    ))
+    connection.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {content} BEGIN
+            INSERT INTO {name} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {content} BEGIN
+            INSERT INTO {name} ({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+        END
+    """))
+    connection.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {column_list} ON {content} BEGIN
+            INSERT INTO {name} ({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {name} (rowid, {column_list}) VALUES (new.id, {new_values});
+        END
+    """))
+    # Indexer les lignes existantes
+    connection.execute(text(f"INSERT INTO {name} ({name}) VALUES ('rebuild')"))
+
+@migration(4, "Full-text search tables for courses, materials and messages")
+def add_fts_tables(connection: Connection):
+    for name, content, columns in FTS_TABLES:
+        create_fts_table(connection, name, content, columns)
+
+@migration(5, "Extracted material text: page index and backfill jobs")
+def add_material_pages_fts(connection: Connection):
+    create_fts_table(connection, "material_pages_fts", "material_pages", ["content"])
+    # Import tardif, comme pour la migration 3
+    from services.extraction_service import schedule_pending_extractions
+    schedule_pending_extractions(connection)
+
+@migration(6, "Initial course statistics")
+def populate_course_stats(connection: Connection):
+    from services.stats_service import rebuild_course_stats
+    rebuild_course_stats(connection)
+
+@migration(7, "Date indexes on course_progress and department daily rollups")
+def populate_department_rollups(connection: Connection):
+    for column in ("start_date", "completion_date", "last_accessed"):
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_course_progress_{column} ON course_progress ({column})"
+        ))
+    from services.report_service import backfill_department_rollups
+    backfill_department_rollups(connection)
+
+def _ensure_version_table(connection: Connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR,
+            applied_at DATETIME
+        )
+    """))
+
+# Attente maximale du verrou de schéma (une migration longue d'un autre processus)
+SCHEMA_LOCK_TIMEOUT_SECONDS = float(os.getenv("SCHEMA_LOCK_TIMEOUT_SECONDS", "300"))
+# Clé du verrou consultatif PostgreSQL
+SCHEMA_LOCK_KEY = 727361
+
+@contextmanager
+def schema_lock(engine: Engine) -> Iterator[Connection]:
+    # Transaction en écriture exclusive : plusieurs workers uvicorn démarrent en
+    # même temps et appliquent le schéma l'un après l'autre. SQLite : BEGIN
+    # IMMEDIATE (verrou d'écriture pris dès le début, le pilote ne doit pas
+    # ouvrir la transaction lui-même, d'où AUTOCOMMIT) ; PostgreSQL : verrou
+    # consultatif libéré à la fin de la transaction.
+    if engine.dialect.name != "sqlite":
+        with engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            yield connection
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        deadline = time.monotonic() + SCHEMA_LOCK_TIMEOUT_SECONDS
+        while True:
+            try:
+                # Attend déjà jusqu'à busy_timeout avant d'échouer
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+                break
+            except OperationalError as error:
+                if "locked" not in str(error) or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+def _recorded_versions(connection: Connection) -> set:
+    _ensure_version_table(connection)
+    return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+def applied_versions(engine: Engine) -> set:
+    with engine.begin() as connection:
+        return _recorded_versions(connection)
+
+def run_migrations(engine: Engine) -> List[Migration]:
+    applied = applied_versions(engine)
+    pending = [m for m in sorted(MIGRATIONS, key=lambda m: m.version) if m.version not in applied]
+    ran = []
+    for pending_migration in pending:
+        # Chaque migration et son enregistrement forment une seule transaction,
+        # sous le verrou de schéma ; une version enregistrée entre-temps par un
+        # autre processus est ignorée
+        with schema_lock(engine) as connection:
+            if pending_migration.version in _recorded_versions(connection):
+                continue
+            pending_migration.upgrade(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": pending_migration.version, "d": pending_migration.description, "t": datetime.utcnow()}
+            )
+        ran.append(pending_migration)
+    return ran
+
+if __name__ == "__main__":
+    from database import engine, init_db
+
+    applied_before = applied_versions(engine)
+    init_db()
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        state = "déjà appliquée" if m.version in applied_before else "appliquée"
+        print(f"{m.version:>4}  {m.description} ({state})")
\ No newline at end of file
@@ -1,7 +1,12 @@
 from .base import Base
 from .user import User
-from .course import Course, CourseMaterial, CourseProgress
+from .course import Course, CourseMaterial, CourseProgress, MaterialPage
 from .notification import Notification
 from .message import Message
+from .job import Job
+from .blob import Blob
+from .counter import UserCounter
+from .stats import CourseStats
+from .report import DepartmentDailyStats, LearnerActivity
 
-__all__ = ['Base', 'User', 'Course', 'CourseMaterial', 'CourseProgress', 'Notification', 'Message'] 
\ No newline at end of file
+__all__ = ['Base', 'User', 'Course', 'CourseMaterial', 'CourseProgress', 'MaterialPage', 'Notification', 'Message', 'Job', 'Blob', 'UserCounter', 'CourseStats', 'DepartmentDailyStats', 'LearnerActivity'] 
\ No newline at end of file
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from .base import Base
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String, primary_key=True)
+    path = Column(String)
+    size = Column(Integer)
+    ref_count = Column(Integer, default=0)  # Nombre de supports / messages qui l'utilisent
+    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
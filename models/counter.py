@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from datetime import datetime
+from .base import Base
+
+# Compteurs de non-lus maintenus à chaque écriture, pour les badges des
+# clients sans parcourir les listes
+class UserCounter(Base):
+    __tablename__ = "user_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_notifications = Column(Integer, default=0)
+    unread_messages = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Float, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .user import Base
@@ -9,9 +9,9 @@ class Course(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(Text)
-    instructor_id = Column(Integer, ForeignKey("users.id"))
+    instructor_id = Column(Integer, ForeignKey("users.id"), index=True)
     departement = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship with User
@@ -23,6 +23,10 @@ class Course(Base):
     progress_records = relationship("CourseProgress", back_populates="course")
     notifications = relationship("Notification", back_populates="course")
 
+    __table_args__ = (
+        Index("ix_courses_departement_created_at", "departement", "created_at"),
+    )
+
 class CourseMaterial(Base):
     __tablename__ = "course_materials"
 
@@ -31,17 +35,39 @@ class CourseMaterial(Base):
     file_name = Column(String)
     file_path = Column(String)
     file_type = Column(String)
+    file_size = Column(Integer, nullable=True)  # Taille en octets
+    sha256 = Column(String, nullable=True, index=True)  # Empreinte du contenu
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    # Extraction du texte en arrière-plan : pending, indexed, failed
+    extraction_status = Column(String, default="pending", nullable=True)
+    extraction_error = Column(Text, nullable=True)
+    extracted_at = Column(DateTime, nullable=True)
     
     course = relationship("Course", back_populates="materials")
     notifications = relationship("Notification", back_populates="material")
+    pages = relationship("MaterialPage", back_populates="material", passive_deletes=True)
+
+# Texte extrait d'un support, une ligne par page (indexé par material_pages_fts)
+class MaterialPage(Base):
+    __tablename__ = "material_pages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    material_id = Column(Integer, ForeignKey("course_materials.id", ondelete="CASCADE"))
+    page_number = Column(Integer)  # À partir de 1
+    content = Column(Text)
+
+    material = relationship("CourseMaterial", back_populates="pages")
+
+    __table_args__ = (
+        Index("ix_material_pages_material_id_page_number", "material_id", "page_number", unique=True),
+    )
 
 class CourseProgress(Base):
     __tablename__ = "course_progress"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    course_id = Column(Integer, ForeignKey("courses.id"))
+    course_id = Column(Integer, ForeignKey("courses.id"), index=True)
     progress = Column(Float, default=0)  # Progression en pourcentage (0-100)
     status = Column(String, default="En cours")  # En cours, Terminé, etc.
     start_date = Column(DateTime, default=datetime.utcnow)
@@ -50,4 +76,13 @@ class CourseProgress(Base):
     is_completed = Column(Boolean, default=False)
 
     user = relationship("User", back_populates="course_progress")
-    course = relationship("Course", back_populates="progress_records") 
\ No newline at end of file
+    course = relationship("Course", back_populates="progress_records")
+
+    # Une seule inscription par utilisateur et par cours ; dates indexées
+    # pour l'agrégation des derniers jours (rapports par département)
+    __table_args__ = (
+        Index("ix_course_progress_user_id_course_id", "user_id", "course_id", unique=True),
+        Index("ix_course_progress_start_date", "start_date"),
+        Index("ix_course_progress_completion_date", "completion_date"),
+        Index("ix_course_progress_last_accessed", "last_accessed"),
+    ) 
\ No newline at end of file
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # notification, ...
+    payload = Column(Text)  # JSON
+    status = Column(String, default="pending")  # pending, processing, dead
+    attempts = Column(Integer, default=0)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_jobs_status_available_at", "status", "available_at"),
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .user import Base
@@ -11,10 +11,18 @@ class Message(Base):
     receiver_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text)
     file_path = Column(String, nullable=True)
+    file_name = Column(String, nullable=True)
     file_type = Column(String, nullable=True)
+    file_size = Column(Integer, nullable=True)
+    sha256 = Column(String, nullable=True, index=True)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
-    receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages") 
\ No newline at end of file
+    receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
+
+    __table_args__ = (
+        Index("ix_messages_receiver_id_created_at", "receiver_id", "created_at"),
+        Index("ix_messages_sender_id_created_at", "sender_id", "created_at"),
+    ) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -19,4 +19,8 @@ class Notification(Base):
     # Relationships
     user = relationship("User", back_populates="notifications")
     course = relationship("Course", back_populates="notifications")
-    material = relationship("CourseMaterial", back_populates="notifications") 
\ No newline at end of file
+    material = relationship("CourseMaterial", back_populates="notifications")
+
+    __table_args__ = (
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+    ) 
\ No newline at end of file
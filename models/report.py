@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime
+from datetime import datetime
+from .base import Base
+
+# Agrégats quotidiens par département de l'apprenant, recalculés
+# périodiquement pour les derniers jours (services.report_service)
+class DepartmentDailyStats(Base):
+    __tablename__ = "department_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    departement = Column(String, primary_key=True)  # "" si non renseigné
+    enrollments = Column(Integer, default=0)
+    completions = Column(Integer, default=0)
+    completion_seconds = Column(Float, default=0)  # Somme des durées inscription -> achèvement
+    active_learners = Column(Integer, default=0)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+# Jours d'activité de chaque apprenant, relevés depuis last_accessed (qui ne
+# garde que le dernier accès) à chaque agrégation : nécessaire pour compter
+# les apprenants distincts sur une période
+class LearnerActivity(Base):
+    __tablename__ = "learner_activity"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    departement = Column(String)
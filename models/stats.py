@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from datetime import datetime
+from .base import Base
+
+# Statistiques par cours tenues à jour à chaque inscription, progression et
+# achèvement, pour les tableaux de bord sans parcourir course_progress
+class CourseStats(Base):
+    __tablename__ = "course_stats"
+
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    enrolled_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    progress_sum = Column(Float, default=0)  # Somme des progressions (moyenne = somme / inscrits)
+    updated_at = Column(DateTime, default=datetime.utcnow)
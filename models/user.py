@@ -15,7 +15,7 @@ class User(Base):
     telephone = Column(String)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
-    is_approved = Column(Boolean, default=False)
+    is_approved = Column(Boolean, default=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship with Course
@@ -0,0 +1,53 @@
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, Response, status
+
+# Pagination par curseur (keyset) sur (created_at, id), en ordre décroissant
+# (ou croissant pour les listes qui ont toujours été triées ainsi).
+# Le curseur est opaque pour les clients : base64 de "<created_at ISO>|<id>".
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def apply_cursor(query, created_at_column, id_column, cursor: Optional[str], descending: bool = True):
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(
+                (created_at_column < created_at) |
+                ((created_at_column == created_at) & (id_column < id))
+            )
+        else:
+            query = query.filter(
+                (created_at_column > created_at) |
+                ((created_at_column == created_at) & (id_column > id))
+            )
+    if descending:
+        return query.order_by(created_at_column.desc(), id_column.desc())
+    return query.order_by(created_at_column.asc(), id_column.asc())
+
+def next_cursor(items: List, limit: int) -> Optional[str]:
+    # Une page pleine signale qu'il peut rester des éléments
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+def set_next_cursor(response: Response, items: List, limit: int):
+    cursor = next_cursor(items, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
\ No newline at end of file
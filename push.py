@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Set
+from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+load_dotenv()
+
+PUSH_HEARTBEAT_SECONDS = float(os.getenv("PUSH_HEARTBEAT_SECONDS", "15"))
+# Événements en attente par connexion ; au-delà le client est déconnecté et
+# rattrape son retard en se reconnectant avec Last-Event-ID
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "64"))
+# Historique conservé par utilisateur pour la reprise, et nombre d'utilisateurs suivis
+PUSH_REPLAY_SIZE = int(os.getenv("PUSH_REPLAY_SIZE", "50"))
+PUSH_REPLAY_USERS = int(os.getenv("PUSH_REPLAY_USERS", "10000"))
+PUSH_MAX_CONNECTIONS = int(os.getenv("PUSH_MAX_CONNECTIONS", "10000"))
+# Délai de reconnexion indiqué aux clients EventSource
+PUSH_RETRY_MILLISECONDS = int(os.getenv("PUSH_RETRY_MILLISECONDS", "5000"))
+
+def _json_default(value):
+    # Mêmes dates ISO 8601 que les réponses de l'API
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class PushEvent(NamedTuple):
+    id: int
+    type: str
+    data: str  # JSON
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n"
+
+class TooManyConnections(Exception):
+    pass
+
+class _History:
+    __slots__ = ("events", "evicted_through")
+
+    def __init__(self, size: int):
+        self.events = deque(maxlen=size)
+        self.evicted_through = 0  # Dernier id sorti de l'historique
+
+class Subscription:
+    __slots__ = ("user_id", "queue", "loop", "replay", "missed")
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+        self.loop = loop
+        self.replay: List[PushEvent] = []
+        self.missed = False
+
+    def deliver(self, push_event: Optional[PushEvent]):
+        try:
+            self.queue.put_nowait(push_event)
+        except asyncio.QueueFull:
+            # Client trop lent : vider la file et fermer le flux
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+# Hub de diffusion en mémoire (un processus) : chaque événement est adressé à
+# un utilisateur et remis à toutes ses connexions ouvertes. publish() peut être
+# appelé depuis n'importe quel thread (worker de jobs, routes synchrones).
+class PushHub:
+    def __init__(self, replay_size: int, replay_users: int, max_connections: int):
+        self.replay_size = replay_size
+        self.replay_users = replay_users
+        self.max_connections = max_connections
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+        # Ids croissants d'un redémarrage à l'autre : tout id antérieur au
+        # démarrage signale des événements perdus
+        self.started_at_id = int(time.time() * 1000)
+        self._last_id = self.started_at_id
+        # Historiques d'utilisateurs évincés : même règle que evicted_through
+        self._evicted_through = 0
+        self.connections = 0
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, user_id: int, type: str, data: dict) -> PushEvent:
+        with self._lock:
+            self._last_id += 1
+            push_event = PushEvent(self._last_id, type, json.dumps(data, default=_json_default))
+            self.published += 1
+
+            history = self._history.get(user_id)
+            if history is None:
+                history = self._history[user_id] = _History(self.replay_size)
+                while len(self._history) > self.replay_users:
+                    _, evicted = self._history.popitem(last=False)
+                    if evicted.events:
+                        self._evicted_through = max(self._evicted_through, evicted.events[-1].id)
+            self._history.move_to_end(user_id)
+            if len(history.events) == history.events.maxlen:
+                history.evicted_through = history.events[0].id
+            history.events.append(push_event)
+
+            subscribers = list(self._subscribers.get(user_id, ()))
+
+        for subscription in subscribers:
+            self._dispatch(subscription, push_event)
+        return push_event
+
+    def _dispatch(self, subscription: Subscription, push_event: Optional[PushEvent]):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is subscription.loop:
+            subscription.deliver(push_event)
+        else:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, push_event)
+            except RuntimeError:
+                # Boucle fermée (arrêt du serveur)
+                self.dropped += 1
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            if self.connections >= self.max_connections:
+                raise TooManyConnections()
+            self.connections += 1
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+
+            # Reprise : l'historique est lu sous le même verrou que l'inscription,
+            # aucun événement n'est ni perdu ni reçu deux fois
+            if last_event_id is not None:
+                history = self._history.get(user_id)
+                events = list(history.events) if history else []
+                subscription.replay = [e for e in events if e.id > last_event_id]
+                horizon = max(
+                    self.started_at_id,
+                    history.evicted_through if history else self._evicted_through
+                )
+                subscription.missed = last_event_id < horizon
+        return subscription
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return self.connections < self.max_connections
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+                self.connections -= 1
+
+    def close_all(self):
+        with self._lock:
+            subscriptions = [s for subscribers in self._subscribers.values() for s in subscribers]
+        for subscription in subscriptions:
+            self._dispatch(subscription, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "users_connected": len(self._subscribers),
+                "users_with_history": len(self._history),
+                "published": self.published,
+                "dropped": self.dropped,
+                "last_event_id": self._last_id
+            }
+
+push_hub = PushHub(PUSH_REPLAY_SIZE, PUSH_REPLAY_USERS, PUSH_MAX_CONNECTIONS)
+
+async def event_stream(
+    user_id: int,
+    last_event_id: Optional[int] = None,
+    heartbeat_seconds: float = None
+) -> AsyncIterator[str]:
+    # Flux text/event-stream : rattrapage, puis événements et commentaires de
+    # heartbeat qui gardent la connexion ouverte à travers les proxys.
+    # L'inscription se fait dans le générateur : un client parti avant le
+    # premier envoi n'a rien réservé, et le finally libère toujours la place.
+    heartbeat_seconds = heartbeat_seconds or PUSH_HEARTBEAT_SECONDS
+    try:
+        subscription = push_hub.subscribe(user_id, last_event_id)
+    except TooManyConnections:
+        # Plein depuis la vérification de la route : le client se reconnectera
+        yield f"retry: {PUSH_RETRY_MILLISECONDS}\n\n"
+        return
+    try:
+        yield f"retry: {PUSH_RETRY_MILLISECONDS}\n\n"
+        if subscription.missed:
+            # L'historique ne couvre pas tout : le client doit recharger ses listes
+            yield "event: reset\ndata: {}\n\n"
+        for push_event in subscription.replay:
+            yield push_event.encode()
+        subscription.replay = []
+
+        while True:
+            try:
+                push_event = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if push_event is None:
+                break
+            yield push_event.encode()
+    finally:
+        push_hub.unsubscribe(subscription)
+
+class EventStreamResponse(StreamingResponse):
+    # Starlette ne ferme pas le générateur quand l'envoi échoue (client
+    # déconnecté) : aclose() garantit l'exécution du finally de event_stream
+    def __init__(self, content: AsyncIterator[str], **kwargs):
+        super().__init__(content, media_type="text/event-stream", **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+# Publication transactionnelle : les événements sont attachés à la session et
+# diffusés seulement après le commit, jamais pour une écriture annulée.
+def publish_after_commit(db, user_id: int, type: str, data: dict):
+    if user_id is None:
+        return
+    db.info.setdefault("push_events", []).append((user_id, type, data))
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session):
+    for user_id, type, data in session.info.pop("push_events", []):
+        push_hub.publish(user_id, type, data)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction):
+    session.info.pop("push_events", None)
@@ -0,0 +1,331 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from cache import several_workers
+from file_serving import etag_matches
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "auto")  # auto, memory, disk, none
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", os.path.join("data", "response_cache"))
+
+# Cache des réponses JSON des endpoints de lecture du catalogue. Chaque entrée
+# porte des tags (ex. "courses", "course:12") ; une écriture invalide ses tags
+# en incrémentant leur version, ce qui rend périmées toutes les entrées
+# enregistrées avec l'ancienne version, sans avoir à les énumérer.
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+    tag_versions: Dict[str, int]
+    expires_at: float
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tag_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def tag_version(self, tag: str) -> int:
+        with self._lock:
+            return self._tag_versions.get(tag, 0)
+
+    def bump_tag(self, tag: str):
+        with self._lock:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+# Backend disque : un fichier par entrée et par tag, partagé entre les
+# processus uvicorn d'une même machine (les invalidations aussi).
+class DiskCacheBackend:
+    def __init__(self, directory: str, max_entries: int):
+        self.max_entries = max_entries
+        self.entries_dir = os.path.join(directory, "entries")
+        self.tags_dir = os.path.join(directory, "tags")
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.tags_dir, exist_ok=True)
+        self._writes = 0
+        self.evictions = 0
+
+    def _path(self, directory: str, name: str) -> str:
+        return os.path.join(directory, hashlib.sha256(name.encode()).hexdigest())
+
+    def _write(self, path: str, data: bytes):
+        # Écriture atomique : un lecteur ne voit jamais un fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(self.entries_dir, key), "rb") as entry_file:
+                return CachedResponse(*pickle.load(entry_file))
+        except (OSError, EOFError, pickle.UnpicklingError, TypeError):
+            return None
+
+    def set(self, key: str, entry: CachedResponse):
+        self._write(self._path(self.entries_dir, key), pickle.dumps(tuple(entry)))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(self.entries_dir, key))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self):
+        # Supprimer les entrées les plus anciennes au-delà de max_entries
+        paths = [os.path.join(self.entries_dir, name) for name in os.listdir(self.entries_dir)]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=lambda path: os.stat(path).st_mtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def tag_version(self, tag: str) -> int:
+        try:
+            with open(self._path(self.tags_dir, tag), "rb") as tag_file:
+                return int(tag_file.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def bump_tag(self, tag: str):
+        # Horodatage en nanosecondes plutôt qu'un compteur : pas de
+        # lecture-écriture concurrente entre processus
+        self._write(self._path(self.tags_dir, tag), str(time.time_ns()).encode())
+
+    def clear(self):
+        for name in os.listdir(self.entries_dir):
+            try:
+                os.remove(os.path.join(self.entries_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def size(self) -> int:
+        return len(os.listdir(self.entries_dir))
+
+class NullCacheBackend:
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return None
+
+    def set(self, key: str, entry: CachedResponse):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+    def tag_version(self, tag: str) -> int:
+        return 0
+
+    def bump_tag(self, tag: str):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self) -> int:
+        return 0
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+class ResponseCache:
+    def __init__(self, backend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_build(
+        self,
+        key: str,
+        tags: Iterable[str],
+        build: Callable[[], Tuple[bytes, Dict[str, str]]]
+    ) -> CachedResponse:
+        # Versions lues avant de construire la réponse : une invalidation
+        # pendant la construction rend l'entrée aussitôt périmée
+        tag_versions = {tag: self.backend.tag_version(tag) for tag in tags}
+        entry = self.backend.get(key)
+        if (entry is not None
+                and entry.tag_versions == tag_versions
+                and entry.expires_at > time.time()):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        body, headers = build()
+        entry = CachedResponse(
+            body=body,
+            etag=body_etag(body),
+            headers=headers,
+            tag_versions=tag_versions,
+            expires_at=time.time() + self.ttl_seconds
+        )
+        self.backend.set(key, entry)
+        return entry
+
+    def invalidate(self, *tags: str):
+        for tag in tags:
+            self.backend.bump_tag(tag)
+        self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+def _create_backend(name: str):
+    # Le cache mémoire n'est invalidé que dans le worker qui a fait l'écriture :
+    # avec plusieurs workers, les autres serviraient des réponses périmées
+    # (et des 304) jusqu'à l'expiration du TTL
+    if name == "auto":
+        name = "disk" if several_workers() else "memory"
+    elif name == "memory" and several_workers():
+        logger.warning(
+            "RESPONSE_CACHE_BACKEND=memory with several workers: invalidations "
+            "only reach the worker that handled the write"
+        )
+    if name == "disk":
+        return DiskCacheBackend(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_ENTRIES)
+    if name == "none" or RESPONSE_CACHE_TTL_SECONDS <= 0:
+        return NullCacheBackend()
+    return MemoryCacheBackend(RESPONSE_CACHE_MAX_ENTRIES)
+
+response_cache = ResponseCache(_create_backend(RESPONSE_CACHE_BACKEND), RESPONSE_CACHE_TTL_SECONDS)
+
+# Invalidation transactionnelle, pour les écritures faites hors des routes
+# (worker de jobs) : les tags sont invalidés seulement après le commit.
+def invalidate_after_commit(db, *tags: str):
+    db.info.setdefault("invalidated_tags", set()).update(tags)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_pending(session: Session):
+    tags = session.info.pop("invalidated_tags", None)
+    if tags:
+        response_cache.invalidate(*sorted(tags))
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction):
+    session.info.pop("invalidated_tags", None)
+
+def course_tags(course_id: int) -> tuple:
+    return ("courses", f"course:{course_id}")
+
+def cache_scope(user) -> str:
+    # Même découpage que course_service._filter_visible_courses : deux
+    # utilisateurs qui voient les mêmes cours partagent les entrées
+    if user is None:
+        return "public"
+    if user.role == "admin":
+        return "admin"
+    if user.role == "prof":
+        return f"prof:{user.id}:{user.departement}"
+    return f"{user.role}:{user.departement}"
+
+def render_json(content: Any, response_type: Any = Any) -> bytes:
+    # Même sérialisation que response_model, directement en octets
+    adapter = TypeAdapter(response_type)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+def conditional_json_response(
+    request: Request,
+    body: bytes,
+    etag: str = None,
+    headers: Dict[str, str] = None
+) -> Response:
+    # 304 sans corps quand le client possède déjà cette version
+    headers = {**(headers or {}), "ETag": etag or body_etag(body), "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def cached_json_response(
+    request: Request,
+    scope: str,
+    tags: Iterable[str],
+    build: Callable[[Response], Any],
+    response_type: Any = Any
+) -> Response:
+    # La clé couvre le chemin, les paramètres et la portée de l'utilisateur
+    key = f"{scope}|{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}"
+
+    def render() -> Tuple[bytes, Dict[str, str]]:
+        # build reçoit une réponse temporaire pour ses en-têtes (ex. X-Next-Cursor)
+        extra = Response()
+        body = render_json(build(extra), response_type)
+        headers = {
+            name: value for name, value in extra.headers.items()
+            if name not in ("content-length", "content-type")
+        }
+        return body, headers
+
+    entry = response_cache.get_or_build(key, tags, render)
+    return conditional_json_response(request, entry.body, entry.etag, entry.headers)
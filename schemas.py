@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, constr
+from pydantic import BaseModel, EmailStr, constr, Field, model_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 class UserBase(BaseModel):
     nom: str
@@ -28,6 +28,23 @@ class UserApproval(BaseModel):
 class PendingUser(User):
     pass
 
+# Bulk import: one row of the CSV/JSON file
+class UserImport(UserBase):
+    password: str = Field(min_length=1)
+
+class UserImportError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+class UserImportResult(BaseModel):
+    created: int
+    failed: int
+    errors: List[UserImportError]
+
+class UserBatchApproval(UserApproval):
+    ids: List[int] = Field(min_length=1, max_length=10000)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -55,7 +72,10 @@ class CourseMaterial(CourseMaterialBase):
     id: int
     course_id: int
     file_path: str
+    file_size: Optional[int] = None
+    sha256: Optional[str] = None
     uploaded_at: datetime
+    extraction_status: Optional[str] = None  # pending, indexed, failed
 
     class Config:
         from_attributes = True
@@ -100,7 +120,27 @@ class Message(MessageBase):
     id: int
     sender_id: int
     file_path: Optional[str] = None
+    file_name: Optional[str] = None
+    file_type: Optional[str] = None
+    file_size: Optional[int] = None
+    is_read: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# Compact form used by the message list: ids and display names instead of
+# the embedded sender/receiver users
+class MessageSummary(BaseModel):
+    id: int
+    sender_id: Optional[int] = None
+    sender_name: Optional[str] = None
+    receiver_id: Optional[int] = None
+    receiver_name: Optional[str] = None
+    content: str
+    file_name: Optional[str] = None
     file_type: Optional[str] = None
+    file_size: Optional[int] = None
     is_read: bool
     created_at: datetime
 
@@ -112,4 +152,58 @@ class MessageInDB(Message):
     receiver: User
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+# Selection for the batch endpoints: explicit ids, everything up to the newest
+# id the client has seen, or all
+class BatchSelection(BaseModel):
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000)
+    up_to_id: Optional[int] = None
+    all: bool = False
+
+    @model_validator(mode="after")
+    def check_single_selector(self):
+        selectors = [self.ids is not None, self.up_to_id is not None, self.all]
+        if sum(selectors) != 1:
+            raise ValueError("Provide exactly one of ids, up_to_id or all")
+        return self
+
+class MessageBatchDelete(BatchSelection):
+    message_type: Optional[str] = None  # "received", "sent" or both when omitted
+
+class BatchResult(BaseModel):
+    count: int
+
+class UserBatchApprovalResult(BatchResult):
+    not_found: List[int]
+
+class CourseStats(BaseModel):
+    course_id: int
+    enrolled: int
+    completed: int
+    completion_rate: float  # Percentage of enrolled users who completed the course
+    average_progress: float  # Percentage
+    updated_at: Optional[datetime] = None
+
+class DepartmentActivity(BaseModel):
+    departement: Optional[str] = None
+    enrollments: int
+    completions: int
+    average_completion_days: Optional[float] = None
+    active_learners: int  # Distinct learners active during the period
+
+class DepartmentReport(BaseModel):
+    start: date
+    end: date
+    rolled_up_at: Optional[datetime] = None  # Last rollup: figures may lag by one interval
+    departments: List[DepartmentActivity]
+
+class SearchResult(BaseModel):
+    kind: str  # course, material or message
+    id: int
+    course_id: Optional[int] = None
+    title: Optional[str] = None
+    snippet: Optional[str] = None  # HTML-escaped, matches wrapped in <mark>
+    page: Optional[int] = None  # Material page the snippet comes from
+    rank: float
+    created_at: Optional[datetime] = None
\ No newline at end of file
@@ -0,0 +1,122 @@
+from sqlalchemy import select, delete, insert, func, literal
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.counter import UserCounter
+from models.notification import Notification
+from models.message import Message
+from models.user import User
+from services.job_queue import register_job_handler
+from typing import Dict, List
+from datetime import datetime
+
+# Les compteurs sont modifiés dans la transaction de l'écriture qui les
+# concerne (création, lecture, suppression) : un rollback annule les deux.
+def _counter_upsert(dialect_name: str):
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = dialect.insert(UserCounter)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserCounter.user_id],
+        set_={
+            "unread_notifications": UserCounter.unread_notifications + stmt.excluded.unread_notifications,
+            "unread_messages": UserCounter.unread_messages + stmt.excluded.unread_messages,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+
+def _counter_rows(deltas: Dict[int, tuple]) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "user_id": user_id,
+            "unread_notifications": notifications,
+            "unread_messages": messages,
+            "updated_at": now
+        }
+        for user_id, (notifications, messages) in deltas.items()
+        if user_id is not None and (notifications or messages)
+    ]
+
+def adjust_unread_counters(
+    db: Session,
+    user_id: int,
+    notifications: int = 0,
+    messages: int = 0
+):
+    rows = _counter_rows({user_id: (notifications, messages)})
+    if rows:
+        db.execute(_counter_upsert(db.bind.dialect.name), rows)
+
+def _bulk_deltas(notifications: Dict[int, int], messages: Dict[int, int]) -> Dict[int, tuple]:
+    notifications = notifications or {}
+    messages = messages or {}
+    return {
+        user_id: (notifications.get(user_id, 0), messages.get(user_id, 0))
+        for user_id in set(notifications) | set(messages)
+    }
+
+def adjust_unread_counters_bulk(
+    db: Session,
+    notifications: Dict[int, int] = None,
+    messages: Dict[int, int] = None
+):
+    # Opérations groupées : un upsert par utilisateur, en un seul executemany
+    rows = _counter_rows(_bulk_deltas(notifications, messages))
+    if rows:
+        db.execute(_counter_upsert(db.bind.dialect.name), rows)
+
+async def adjust_unread_counters_async(
+    db: AsyncSession,
+    user_id: int,
+    notifications: int = 0,
+    messages: int = 0
+):
+    rows = _counter_rows({user_id: (notifications, messages)})
+    if rows:
+        await db.execute(_counter_upsert(db.bind.dialect.name), rows)
+
+async def adjust_unread_counters_bulk_async(
+    db: AsyncSession,
+    notifications: Dict[int, int] = None,
+    messages: Dict[int, int] = None
+):
+    rows = _counter_rows(_bulk_deltas(notifications, messages))
+    if rows:
+        await db.execute(_counter_upsert(db.bind.dialect.name), rows)
+
+def _counts_query(user_id: int):
+    return select(UserCounter.unread_notifications, UserCounter.unread_messages)\
+        .filter(UserCounter.user_id == user_id)
+
+def _as_counts(row) -> dict:
+    # Pas de ligne : l'utilisateur n'a encore rien reçu
+    if row is None:
+        return {"notifications": 0, "messages": 0}
+    return {"notifications": max(row[0] or 0, 0), "messages": max(row[1] or 0, 0)}
+
+def get_unread_counts(db: Session, user_id: int) -> dict:
+    return _as_counts(db.execute(_counts_query(user_id)).first())
+
+async def get_unread_counts_async(db: AsyncSession, user_id: int) -> dict:
+    result = await db.execute(_counts_query(user_id))
+    return _as_counts(result.first())
+
+def rebuild_unread_counters(db):
+    # Recalcul complet depuis les tables source ; accepte une Session ou une Connection
+    unread_notifications = select(func.count(Notification.id))\
+        .where(Notification.user_id == User.id, Notification.is_read == False)\
+        .scalar_subquery()
+    unread_messages = select(func.count(Message.id))\
+        .where(Message.receiver_id == User.id, Message.is_read == False)\
+        .scalar_subquery()
+    
+    db.execute(delete(UserCounter))
+    db.execute(insert(UserCounter).from_select(
+        ["user_id", "unread_notifications", "unread_messages", "updated_at"],
+        select(User.id, unread_notifications, unread_messages, literal(datetime.utcnow()))
+    ))
+
+@register_job_handler("reconcile_unread_counters")
+def reconcile_unread_counters(db: Session, payloads: List[dict]):
+    # Plusieurs demandes dans le même lot : un seul recalcul suffit
+    rebuild_unread_counters(db)
@@ -1,30 +1,46 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, true
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.course import Course
 from models.user import User
 from typing import List, Optional
+from pagination import apply_cursor
 
-def get_courses(
-    db: Session,
-    user: User,
-    skip: int = 0,
-    limit: int = 100
-) -> List[Course]:
-    query = db.query(Course)
-    
+def visible_courses_clause(user: User):
     # Admin peut voir tous les cours
     if user.role == "admin":
-        pass
+        return true()
     # Prof peut voir ses propres cours et ceux de son département
     elif user.role == "prof":
-        query = query.filter(
-            (Course.instructor_id == user.id) | 
+        return (Course.instructor_id == user.id) | \
             (Course.departement == user.departement)
-        )
     # Employer ne peut voir que les cours de son département
     elif user.role == "employer":
-        query = query.filter(Course.departement == user.departement)
+        return Course.departement == user.departement
+    return true()
+
+def _filter_visible_courses(query, user: User):
+    return query.filter(visible_courses_clause(user))
+
+def _can_view_course(course: Course, user: User) -> bool:
+    if user.role == "admin":
+        return True
+    elif user.role == "prof" and (course.instructor_id == user.id or course.departement == user.departement):
+        return True
+    elif user.role == "employer" and course.departement == user.departement:
+        return True
+    return False
+
+def get_courses(
+    db: Session,
+    user: User,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> List[Course]:
+    query = _filter_visible_courses(db.query(Course), user)
     
-    return query.order_by(Course.created_at.desc())\
+    return apply_cursor(query, Course.created_at, Course.id, cursor)\
         .offset(skip)\
         .limit(limit)\
         .all()
@@ -40,11 +56,7 @@ def get_course(
         return None
     
     # Vérifier les permissions
-    if user.role == "admin":
-        return course
-    elif user.role == "prof" and (course.instructor_id == user.id or course.departement == user.departement):
-        return course
-    elif user.role == "employer" and course.departement == user.departement:
+    if _can_view_course(course, user):
         return course
     
     return None
@@ -101,4 +113,92 @@ def delete_course(
     
     db.delete(course)
     db.commit()
+    return True
+
+# Variantes asynchrones (AsyncSession). Les supports de cours sont chargés
+# explicitement car le lazy loading n'est pas possible en asynchrone.
+async def get_courses_async(
+    db: AsyncSession,
+    user: User,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> List[Course]:
+    query = _filter_visible_courses(
+        select(Course).options(selectinload(Course.materials)),
+        user
+    )
+    result = await db.execute(
+        apply_cursor(query, Course.created_at, Course.id, cursor)
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_course_async(
+    db: AsyncSession,
+    course_id: int,
+    user: User
+) -> Optional[Course]:
+    result = await db.execute(
+        select(Course)
+        .options(selectinload(Course.materials))
+        .filter(Course.id == course_id)
+    )
+    course = result.scalars().first()
+    
+    if not course or not _can_view_course(course, user):
+        return None
+    return course
+
+async def create_course_async(
+    db: AsyncSession,
+    course_data: dict,
+    instructor: User
+) -> Course:
+    course = Course(
+        title=course_data["title"],
+        description=course_data["description"],
+        departement=instructor.departement,  # Le cours est créé dans le département du professeur
+        instructor_id=instructor.id
+    )
+    db.add(course)
+    await db.commit()
+    return await get_course_async(db, course.id, instructor)
+
+async def update_course_async(
+    db: AsyncSession,
+    course_id: int,
+    course_data: dict,
+    user: User
+) -> Optional[Course]:
+    course = await get_course_async(db, course_id, user)
+    if not course:
+        return None
+    
+    # Seul le professeur qui a créé le cours peut le modifier
+    if user.role != "admin" and course.instructor_id != user.id:
+        return None
+    
+    for key, value in course_data.items():
+        setattr(course, key, value)
+    
+    await db.commit()
+    return course
+
+async def delete_course_async(
+    db: AsyncSession,
+    course_id: int,
+    user: User
+) -> bool:
+    course = await get_course_async(db, course_id, user)
+    if not course:
+        return False
+    
+    # Seul l'admin ou le professeur qui a créé le cours peut le supprimer
+    if user.role != "admin" and course.instructor_id != user.id:
+        return False
+    
+    await db.delete(course)
+    await db.commit()
     return True 
\ No newline at end of file
@@ -0,0 +1,121 @@
+from sqlalchemy import select
+from database import SessionLocal
+from models.course import Course, CourseProgress
+from models.user import User
+from typing import Iterator, List, Optional
+from datetime import date, datetime, timedelta
+import csv
+import io
+import json
+import os
+
+# Lignes lues par aller-retour avec la base, et écrites par morceau de réponse
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+def _date_range(column, start: Optional[date], end: Optional[date]) -> list:
+    # Bornes incluses : `end` couvre toute la journée
+    conditions = []
+    if start is not None:
+        conditions.append(column >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        conditions.append(column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return conditions
+
+def progress_export_query(
+    departement: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    completed: Optional[bool] = None
+):
+    # Une ligne par inscription ; la période porte sur la date d'inscription
+    query = select(
+        CourseProgress.id,
+        CourseProgress.user_id,
+        User.email,
+        User.nom,
+        User.prenom,
+        User.departement,
+        CourseProgress.course_id,
+        Course.title.label("course_title"),
+        CourseProgress.progress,
+        CourseProgress.status,
+        CourseProgress.is_completed,
+        CourseProgress.start_date,
+        CourseProgress.completion_date,
+        CourseProgress.last_accessed
+    )\
+        .join(User, User.id == CourseProgress.user_id)\
+        .join(Course, Course.id == CourseProgress.course_id)\
+        .where(*_date_range(CourseProgress.start_date, start, end))\
+        .order_by(CourseProgress.id)
+    if departement is not None:
+        query = query.where(User.departement == departement)
+    if completed is not None:
+        query = query.where(CourseProgress.is_completed == completed)
+    return query
+
+def users_export_query(
+    departement: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    # Jamais le mot de passe haché ; la période porte sur la date de création
+    query = select(
+        User.id,
+        User.nom,
+        User.prenom,
+        User.email,
+        User.telephone,
+        User.departement,
+        User.role,
+        User.is_active,
+        User.is_approved,
+        User.created_at
+    )\
+        .where(*_date_range(User.created_at, start, end))\
+        .order_by(User.id)
+    if departement is not None:
+        query = query.where(User.departement == departement)
+    return query
+
+def _value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def _csv_chunk(rows: List[tuple], header: Optional[List[str]] = None) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows([_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+def _ndjson_chunk(rows: List[tuple], columns: List[str]) -> str:
+    return "".join(
+        json.dumps({column: _value(value) for column, value in zip(columns, row)}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+def stream_export(query, export_format: str) -> Iterator[bytes]:
+    # Générateur parcouru par StreamingResponse (dans le pool de threads) :
+    # les lignes arrivent par lots de EXPORT_BATCH_SIZE depuis le curseur et
+    # chaque lot est écrit puis oublié. La mémoire ne dépend pas de la taille
+    # de la table. Session propre à l'export, fermée à la fin ou à la
+    # déconnexion du client.
+    db = SessionLocal()
+    try:
+        result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        if export_format == "csv":
+            yield _csv_chunk([], header=columns).encode()
+        for rows in result.partitions():
+            if export_format == "csv":
+                yield _csv_chunk(rows).encode()
+            else:
+                yield _ndjson_chunk(rows, columns).encode()
+    finally:
+        db.close()
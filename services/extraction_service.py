@@ -0,0 +1,189 @@
+from sqlalchemy import select, update, insert
+from sqlalchemy.orm import Session
+from models.course import CourseMaterial, MaterialPage
+from models.job import Job
+from services.job_queue import enqueue_job, register_job_handler
+from extraction import extract_pages, file_kind
+from response_cache import invalidate_after_commit, course_tags
+from typing import List, NamedTuple, Optional
+from datetime import datetime
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "60"))
+# Un processus est remplacé après ce nombre de fichiers (mémoire des parseurs)
+EXTRACTION_TASKS_PER_WORKER = int(os.getenv("EXTRACTION_TASKS_PER_WORKER", "50"))
+# Supports traités par lot de jobs ; le reste est replanifié. Avec les valeurs
+# par défaut un lot dure au plus 8 / 2 * 60 s, sous JOB_CLAIM_TIMEOUT_SECONDS.
+# Les jobs d'extraction ont leur propre boucle de worker : un lot de gros PDF
+# ne retarde pas les notifications ni la suppression des pièces jointes.
+EXTRACTION_BATCH_SIZE = int(os.getenv("EXTRACTION_BATCH_SIZE", "8"))
+
+EXTRACTION_JOB = "extract_material_text"
+
+class ExtractionResult(NamedTuple):
+    pages: List[str]
+    error: Optional[str]
+
+# Pool de processus dédié à l'analyse des fichiers : les workers de l'API et
+# le worker de jobs ne font jamais l'analyse eux-mêmes. Processus "spawn" :
+# rien n'est hérité du serveur (connexions SQLite, threads). Comme pour tout
+# pool spawn, un script qui lance le serveur ou le worker doit protéger son
+# code par if __name__ == "__main__" (c'est le cas de uvicorn main:app).
+class ExtractionPool:
+    def __init__(self, workers: int, timeout_seconds: float, tasks_per_worker: int):
+        self.workers = max(workers, 1)
+        self.timeout_seconds = timeout_seconds
+        self.tasks_per_worker = tasks_per_worker
+        self._pool = None
+        self._lock = threading.Lock()
+        self.extracted = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.get_context("spawn").Pool(
+                    self.workers, maxtasksperchild=self.tasks_per_worker
+                )
+            return self._pool
+
+    def _restart(self):
+        # terminate() est le seul moyen d'arrêter un processus bloqué sur un fichier
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            self.restarts += 1
+
+    def extract(self, files: List[tuple]) -> List[ExtractionResult]:
+        # Fenêtres de `workers` fichiers : chacun dispose de tout son délai
+        # à partir du moment où il est réellement pris en charge
+        results = []
+        for start in range(0, len(files), self.workers):
+            pool = self._get_pool()
+            pending = [pool.apply_async(extract_pages, file) for file in files[start:start + self.workers]]
+            deadline = time.monotonic() + self.timeout_seconds
+            timed_out = False
+            for async_result in pending:
+                try:
+                    pages = async_result.get(max(deadline - time.monotonic(), 0))
+                    results.append(ExtractionResult(pages, None))
+                    self.extracted += 1
+                except multiprocessing.TimeoutError:
+                    results.append(ExtractionResult([], f"Extraction timed out after {self.timeout_seconds:g}s"))
+                    self.timeouts += 1
+                    timed_out = True
+                except Exception as error:
+                    results.append(ExtractionResult([], f"{type(error).__name__}: {error}"))
+                    self.failed += 1
+            if timed_out:
+                self._restart()
+        return results
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self._pool is not None,
+            "timeout_seconds": self.timeout_seconds,
+            "extracted": self.extracted,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts
+        }
+
+extraction_pool = ExtractionPool(EXTRACTION_WORKERS, EXTRACTION_TIMEOUT_SECONDS, EXTRACTION_TASKS_PER_WORKER)
+
+def schedule_extraction(db: Session, material: CourseMaterial):
+    # Dans la transaction de l'enregistrement du support (id obtenu par flush)
+    material.extraction_status = "pending"
+    material.extraction_error = None
+    db.flush()
+    enqueue_job(db, EXTRACTION_JOB, {"material_id": material.id}, commit=False)
+
+def schedule_pending_extractions(db) -> int:
+    # Supports antérieurs à l'extraction (statut vide) ; accepte une Session ou une Connection
+    material_ids = db.execute(
+        select(CourseMaterial.id).where(CourseMaterial.extraction_status == None)
+    ).scalars().all()
+    if not material_ids:
+        return 0
+    now = datetime.utcnow()
+    db.execute(
+        update(CourseMaterial)
+        .where(CourseMaterial.id.in_(material_ids))
+        .values(extraction_status="pending")
+    )
+    db.execute(insert(Job), [
+        {
+            "kind": EXTRACTION_JOB,
+            "payload": json.dumps({"material_id": material_id}),
+            "status": "pending",
+            "attempts": 0,
+            "available_at": now,
+            "created_at": now
+        }
+        for material_id in material_ids
+    ])
+    return len(material_ids)
+
+def _store_pages(db: Session, material: CourseMaterial, result: ExtractionResult):
+    db.query(MaterialPage)\
+        .filter(MaterialPage.material_id == material.id)\
+        .delete(synchronize_session=False)
+    db.add_all(
+        MaterialPage(material_id=material.id, page_number=number, content=content)
+        for number, content in enumerate(result.pages, start=1)
+        if content
+    )
+    material.extraction_status = "failed" if result.error else "indexed"
+    material.extraction_error = result.error
+    material.extracted_at = datetime.utcnow()
+
+@register_job_handler(EXTRACTION_JOB, dedicated_worker=True, batch_size=EXTRACTION_BATCH_SIZE)
+def extract_material_text(db: Session, payloads: List[dict]):
+    material_ids = list(dict.fromkeys(payload["material_id"] for payload in payloads))
+    for material_id in material_ids[EXTRACTION_BATCH_SIZE:]:
+        enqueue_job(db, EXTRACTION_JOB, {"material_id": material_id}, commit=False)
+
+    # Supports supprimés entre-temps : rien à faire
+    materials = db.query(CourseMaterial)\
+        .filter(CourseMaterial.id.in_(material_ids[:EXTRACTION_BATCH_SIZE]))\
+        .order_by(CourseMaterial.id)\
+        .all()
+
+    readable = []
+    for material in materials:
+        if file_kind(material.file_name, material.file_type) is None:
+            _store_pages(db, material, ExtractionResult([], "Unsupported file type"))
+        elif not material.file_path or not os.path.exists(material.file_path):
+            _store_pages(db, material, ExtractionResult([], "File not found"))
+        else:
+            readable.append(material)
+    results = extraction_pool.extract([(m.file_path, m.file_name, m.file_type) for m in readable])
+
+    for material, result in zip(readable, results):
+        if result.error:
+            logger.warning("Text extraction failed for material %s: %s", material.id, result.error)
+        _store_pages(db, material, result)
+
+    # Le statut figure dans les listes de supports mises en cache
+    for course_id in {material.course_id for material in materials}:
+        invalidate_after_commit(db, *course_tags(course_id))
@@ -0,0 +1,189 @@
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models.job import Job
+from typing import Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_ENABLED = os.getenv("JOB_WORKER_ENABLED", "true").lower() == "true"
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "100"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "5"))
+# Un job resté "processing" plus longtemps (worker arrêté) est remis en file
+JOB_CLAIM_TIMEOUT_SECONDS = float(os.getenv("JOB_CLAIM_TIMEOUT_SECONDS", "300"))
+
+# Les handlers reçoivent la session et la liste des payloads d'un même type.
+# Ils ne font pas de commit : le traitement et la suppression des jobs sont
+# validés dans la même transaction.
+_handlers: Dict[str, Callable[[Session, List[dict]], None]] = {}
+# Types de jobs lents traités par leur propre boucle (type -> taille de lot) :
+# ils ne retardent jamais les notifications de la boucle principale
+_dedicated: Dict[str, int] = {}
+
+def register_job_handler(kind: str, dedicated_worker: bool = False, batch_size: Optional[int] = None):
+    def decorator(handler):
+        _handlers[kind] = handler
+        if dedicated_worker:
+            _dedicated[kind] = batch_size or JOB_BATCH_SIZE
+        return handler
+    return decorator
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: dict,
+    commit: bool = True
+) -> Job:
+    job = Job(kind=kind, payload=json.dumps(payload), status="pending", attempts=0)
+    db.add(job)
+    if commit:
+        db.commit()
+    return job
+
+def claim_jobs(
+    db: Session,
+    worker_id: str,
+    batch_size: int = JOB_BATCH_SIZE,
+    kind: Optional[str] = None
+) -> List[Job]:
+    # kind : un type à boucle dédiée ; sinon tous les autres types (y compris
+    # les types inconnus, qui finissent en dead letter)
+    now = datetime.utcnow()
+    
+    # Reprendre les jobs abandonnés par un worker arrêté en cours de traitement
+    db.query(Job)\
+        .filter(
+            Job.status == "processing",
+            Job.claimed_at < now - timedelta(seconds=JOB_CLAIM_TIMEOUT_SECONDS)
+        )\
+        .update({Job.status: "pending", Job.claimed_by: None}, synchronize_session=False)
+    
+    # Réservation atomique : SQLite sérialise les écritures
+    available = select(Job.id)\
+        .where(Job.status == "pending", Job.available_at <= now)
+    if kind is not None:
+        available = available.where(Job.kind == kind)
+    elif _dedicated:
+        available = available.where(Job.kind.not_in(list(_dedicated)))
+    available = available\
+        .order_by(Job.id)\
+        .limit(batch_size)\
+        .scalar_subquery()
+    db.query(Job)\
+        .filter(Job.id.in_(available), Job.status == "pending")\
+        .update({
+            Job.status: "processing",
+            Job.claimed_by: worker_id,
+            Job.claimed_at: now,
+            Job.attempts: Job.attempts + 1
+        }, synchronize_session=False)
+    db.commit()
+    
+    return db.query(Job)\
+        .filter(Job.status == "processing", Job.claimed_by == worker_id)\
+        .order_by(Job.id)\
+        .all()
+
+def _mark_failed(db: Session, job: Job, error: Exception):
+    job.last_error = f"{type(error).__name__}: {error}"
+    job.claimed_by = None
+    if job.attempts >= JOB_MAX_ATTEMPTS:
+        # Dead letter : conservé pour inspection, plus jamais réessayé
+        job.status = "dead"
+        logger.error("Job %s (%s) dead-lettered: %s", job.id, job.kind, job.last_error)
+    else:
+        job.status = "pending"
+        delay = JOB_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1)
+        job.available_at = datetime.utcnow() + timedelta(seconds=delay)
+
+def _run_handler(db: Session, jobs: List[Job]):
+    handler = _handlers.get(jobs[0].kind)
+    if handler is None:
+        raise LookupError(f"No handler registered for job kind '{jobs[0].kind}'")
+    handler(db, [json.loads(job.payload) for job in jobs])
+    for job in jobs:
+        db.delete(job)
+    db.commit()
+
+def process_jobs(
+    db: Session,
+    worker_id: str,
+    batch_size: int = JOB_BATCH_SIZE,
+    kind: Optional[str] = None
+) -> int:
+    jobs = claim_jobs(db, worker_id, batch_size, kind)
+    
+    by_kind: Dict[str, List[Job]] = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+    
+    for group in by_kind.values():
+        try:
+            _run_handler(db, group)
+        except Exception:
+            db.rollback()
+            # Rejouer un par un pour isoler le ou les jobs fautifs
+            for job in group:
+                try:
+                    _run_handler(db, [job])
+                except Exception as error:
+                    db.rollback()
+                    _mark_failed(db, job, error)
+                    db.commit()
+    
+    return len(jobs)
+
+def get_queue_stats(db: Session) -> dict:
+    counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    return {
+        "pending": counts.get("pending", 0),
+        "processing": counts.get("processing", 0),
+        "dead": counts.get("dead", 0)
+    }
+
+def _process_batch(worker_id: str, batch_size: int, kind: Optional[str]) -> int:
+    db = SessionLocal()
+    try:
+        return process_jobs(db, worker_id, batch_size, kind)
+    finally:
+        db.close()
+
+async def run_job_worker(kind: Optional[str] = None):
+    batch_size = _dedicated[kind] if kind is not None else JOB_BATCH_SIZE
+    worker_id = f"{os.getpid()}-{kind or 'jobs'}-{uuid.uuid4().hex[:8]}"
+    while True:
+        try:
+            processed = await run_in_threadpool(_process_batch, worker_id, batch_size, kind)
+        except Exception:
+            logger.exception("Job worker iteration failed (%s)", kind or "default")
+            processed = 0
+        if processed < batch_size:
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+_worker_tasks: List[asyncio.Task] = []
+
+def start_job_worker():
+    # Une boucle principale, plus une par type de job dédié
+    if JOB_WORKER_ENABLED and not _worker_tasks:
+        for kind in [None, *_dedicated]:
+            _worker_tasks.append(asyncio.create_task(run_job_worker(kind)))
+
+async def stop_job_worker():
+    tasks = list(_worker_tasks)
+    _worker_tasks.clear()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
@@ -1,33 +1,48 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete
+from sqlalchemy.orm import Session, selectinload, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from models.message import Message
-from typing import List
+from models.user import User
+from typing import Iterable, List, Optional
 from fastapi import UploadFile
+from storage import (
+    store_upload,
+    stage_upload,
+    commit_staged_upload,
+    discard_staged_upload,
+    release_blob
+)
+from utils import StoredFile
+from pagination import apply_cursor
+from push import publish_after_commit
+from services.counter_service import (
+    adjust_unread_counters,
+    adjust_unread_counters_async,
+    adjust_unread_counters_bulk,
+    adjust_unread_counters_bulk_async
+)
+from services.job_queue import enqueue_job, register_job_handler
+from collections import Counter
 import os
-from datetime import datetime
 
-def save_message_file(file: UploadFile, message_id: int) -> tuple[str, str]:
-    # Create messages directory if it doesn't exist
-    messages_dir = "uploads/messages"
-    if not os.path.exists(messages_dir):
-        os.makedirs(messages_dir)
-    
-    # Create message-specific directory
-    message_dir = os.path.join(messages_dir, str(message_id))
-    if not os.path.exists(message_dir):
-        os.makedirs(message_dir)
-    
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{timestamp}_{file.filename}"
-    file_path = os.path.join(message_dir, unique_filename)
-    
-    # Save the file
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    return file_path, file.content_type
+def attach_message_file(message: Message, file: UploadFile, stored_file: StoredFile):
+    message.file_path = stored_file.path
+    message.file_name = file.filename
+    message.file_type = file.content_type
+    message.file_size = stored_file.size
+    message.sha256 = stored_file.sha256
+
+def _publish_message(db, message: Message):
+    # Diffusé au destinataire après le commit ; le flush fournit id et created_at
+    publish_after_commit(db, message.receiver_id, "message", {
+        "id": message.id,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "content": message.content,
+        "file_name": message.file_name,
+        "created_at": message.created_at
+    })
 
 def create_message(
     db: Session,
@@ -41,18 +56,18 @@ def create_message(
         receiver_id=receiver_id,
         content=content
     )
+    
+    # If file is provided, store it (deduplicated by content)
+    if file:
+        attach_message_file(message, file, store_upload(db, file))
+    
     db.add(message)
+    adjust_unread_counters(db, receiver_id, messages=1)
+    db.flush()
+    _publish_message(db, message)
     db.commit()
     db.refresh(message)
     
-    # If file is provided, save it
-    if file:
-        file_path, file_type = save_message_file(file, message.id)
-        message.file_path = file_path
-        message.file_type = file_type
-        db.commit()
-        db.refresh(message)
-    
     return message
 
 def get_user_messages(
@@ -60,7 +75,8 @@ def get_user_messages(
     user_id: int,
     message_type: str = "received",  # "received" or "sent"
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[Message]:
     query = db.query(Message)
     
@@ -69,11 +85,63 @@ def get_user_messages(
     else:  # sent
         query = query.filter(Message.sender_id == user_id)
     
-    return query.order_by(Message.created_at.desc())\
+    return apply_cursor(query, Message.created_at, Message.id, cursor)\
         .offset(skip)\
         .limit(limit)\
         .all()
 
+def _summary_query(
+    user_id: int,
+    message_type: str,
+    skip: int,
+    limit: int,
+    cursor: Optional[str]
+):
+    # Projection de liste : colonnes utiles et noms affichés en un seul SELECT
+    # joint, sans charger d'objets Message ni User
+    sender = aliased(User)
+    receiver = aliased(User)
+    query = select(
+        Message.id,
+        Message.sender_id,
+        (sender.prenom + " " + sender.nom).label("sender_name"),
+        Message.receiver_id,
+        (receiver.prenom + " " + receiver.nom).label("receiver_name"),
+        Message.content,
+        Message.file_name,
+        Message.file_type,
+        Message.file_size,
+        Message.is_read,
+        Message.created_at
+    )\
+        .outerjoin(sender, sender.id == Message.sender_id)\
+        .outerjoin(receiver, receiver.id == Message.receiver_id)
+    
+    if message_type == "received":
+        query = query.filter(Message.receiver_id == user_id)
+    else:  # sent
+        query = query.filter(Message.sender_id == user_id)
+    
+    return apply_cursor(query, Message.created_at, Message.id, cursor)\
+        .offset(skip)\
+        .limit(limit)
+
+def get_message_summaries(
+    db: Session,
+    user_id: int,
+    message_type: str = "received",  # "received" or "sent"
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> list:
+    return db.execute(_summary_query(user_id, message_type, skip, limit, cursor)).all()
+
+def _flag_as_read(message_id: int):
+    # UPDATE conditionnel : seul le passage de non lu à lu décrémente le compteur
+    return update(Message)\
+        .where(Message.id == message_id, Message.is_read == False)\
+        .values(is_read=True)
+
 def get_message(
     db: Session,
     message_id: int,
@@ -87,7 +155,8 @@ def get_message(
         .first()
     
     if message and message.receiver_id == user_id and not message.is_read:
-        message.is_read = True
+        if db.execute(_flag_as_read(message.id)).rowcount:
+            adjust_unread_counters(db, user_id, messages=-1)
         db.commit()
         db.refresh(message)
     
@@ -106,12 +175,34 @@ def mark_message_as_read(
         .first()
     
     if message:
-        message.is_read = True
+        if db.execute(_flag_as_read(message.id)).rowcount:
+            adjust_unread_counters(db, user_id, messages=-1)
         db.commit()
         db.refresh(message)
     
     return message
 
+def _mark_read_batch(user_id: int, ids: Optional[List[int]], up_to_id: Optional[int]):
+    # Sans ids ni up_to_id : tous les messages reçus non lus
+    stmt = update(Message)\
+        .where(Message.receiver_id == user_id, Message.is_read == False)
+    if ids is not None:
+        stmt = stmt.where(Message.id.in_(ids))
+    if up_to_id is not None:
+        stmt = stmt.where(Message.id <= up_to_id)
+    return stmt.values(is_read=True).execution_options(synchronize_session=False)
+
+def mark_messages_as_read(
+    db: Session,
+    user_id: int,
+    ids: Optional[List[int]] = None,
+    up_to_id: Optional[int] = None
+) -> int:
+    updated = db.execute(_mark_read_batch(user_id, ids, up_to_id)).rowcount
+    adjust_unread_counters(db, user_id, messages=-updated)
+    db.commit()
+    return updated
+
 def delete_message(
     db: Session,
     message_id: int,
@@ -125,16 +216,242 @@ def delete_message(
         .first()
     
     if message:
-        # Delete associated file if exists
-        if message.file_path and os.path.exists(message.file_path):
-            os.remove(message.file_path)
-            # Remove directory if empty
-            message_dir = os.path.dirname(message.file_path)
-            if not os.listdir(message_dir):
-                os.rmdir(message_dir)
-        
+        if not message.is_read:
+            adjust_unread_counters(db, message.receiver_id, messages=-1)
+        schedule_file_removal(db, [message])
         db.delete(message)
         db.commit()
         return True
     
-    return False 
\ No newline at end of file
+    return False
+
+def _delete_batch(
+    user_id: int,
+    message_type: Optional[str],
+    ids: Optional[List[int]],
+    up_to_id: Optional[int]
+):
+    stmt = delete(Message)
+    if message_type == "received":
+        stmt = stmt.where(Message.receiver_id == user_id)
+    elif message_type == "sent":
+        stmt = stmt.where(Message.sender_id == user_id)
+    else:
+        stmt = stmt.where((Message.sender_id == user_id) | (Message.receiver_id == user_id))
+    if ids is not None:
+        stmt = stmt.where(Message.id.in_(ids))
+    if up_to_id is not None:
+        stmt = stmt.where(Message.id <= up_to_id)
+    # RETURNING : compteurs et fichiers à traiter sans relire les lignes
+    return stmt\
+        .returning(Message.receiver_id, Message.is_read, Message.sha256, Message.file_path)\
+        .execution_options(synchronize_session=False)
+
+def _unread_by_receiver(deleted) -> dict:
+    # Counter négatif : les messages non lus supprimés sortent des compteurs
+    return {
+        receiver_id: -count
+        for receiver_id, count in Counter(row.receiver_id for row in deleted if not row.is_read).items()
+    }
+
+def delete_messages(
+    db: Session,
+    user_id: int,
+    message_type: Optional[str] = None,
+    ids: Optional[List[int]] = None,
+    up_to_id: Optional[int] = None
+) -> int:
+    deleted = db.execute(_delete_batch(user_id, message_type, ids, up_to_id)).all()
+    adjust_unread_counters_bulk(db, messages=_unread_by_receiver(deleted))
+    schedule_file_removal(db, deleted)
+    db.commit()
+    return len(deleted)
+
+def schedule_file_removal(db, messages: Iterable):
+    # Les pièces jointes sont libérées par le worker de jobs, dans la même
+    # transaction que la suppression des messages
+    sha256s = [message.sha256 for message in messages if message.sha256]
+    paths = [message.file_path for message in messages if message.file_path and not message.sha256]
+    if sha256s or paths:
+        enqueue_job(db, "message_files", {"sha256": sha256s, "paths": paths}, commit=False)
+
+@register_job_handler("message_files")
+def sweep_message_files(db: Session, payloads: List[dict]):
+    for payload in payloads:
+        # Release the shared blobs; files stored before deduplication are removed directly
+        for sha256 in payload["sha256"]:
+            release_blob(db, sha256)
+        for path in payload["paths"]:
+            if os.path.exists(path):
+                os.remove(path)
+                # Remove directory if empty
+                message_dir = os.path.dirname(path)
+                if not os.listdir(message_dir):
+                    os.rmdir(message_dir)
+
+# Variantes asynchrones (AsyncSession). Les relations sender/receiver sont
+# chargées explicitement car le lazy loading n'est pas possible en asynchrone.
+def _message_query():
+    return select(Message).options(
+        selectinload(Message.sender),
+        selectinload(Message.receiver)
+    )
+
+async def _load_message(db: AsyncSession, message_id: int) -> Message:
+    result = await db.execute(
+        _message_query()
+        .filter(Message.id == message_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+async def create_message_async(
+    db: AsyncSession,
+    sender_id: int,
+    receiver_id: int,
+    content: str,
+    file: UploadFile = None
+) -> Message:
+    message = Message(
+        sender_id=sender_id,
+        receiver_id=receiver_id,
+        content=content
+    )
+    
+    # If file is provided, stream it off the event loop, then register the blob
+    if file:
+        staged = await run_in_threadpool(stage_upload, file)
+        try:
+            stored_file = await db.run_sync(commit_staged_upload, staged)
+        except BaseException:
+            discard_staged_upload(staged)
+            raise
+        attach_message_file(message, file, stored_file)
+    
+    db.add(message)
+    await adjust_unread_counters_async(db, receiver_id, messages=1)
+    await db.flush()
+    _publish_message(db, message)
+    await db.commit()
+    
+    return await _load_message(db, message.id)
+
+async def get_user_messages_async(
+    db: AsyncSession,
+    user_id: int,
+    message_type: str = "received",  # "received" or "sent"
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> List[Message]:
+    query = _message_query()
+    
+    if message_type == "received":
+        query = query.filter(Message.receiver_id == user_id)
+    else:  # sent
+        query = query.filter(Message.sender_id == user_id)
+    
+    result = await db.execute(
+        apply_cursor(query, Message.created_at, Message.id, cursor)
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_message_summaries_async(
+    db: AsyncSession,
+    user_id: int,
+    message_type: str = "received",  # "received" or "sent"
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> list:
+    result = await db.execute(_summary_query(user_id, message_type, skip, limit, cursor))
+    return result.all()
+
+async def get_message_async(
+    db: AsyncSession,
+    message_id: int,
+    user_id: int
+) -> Message:
+    result = await db.execute(
+        _message_query().filter(
+            Message.id == message_id,
+            (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+        )
+    )
+    message = result.scalars().first()
+    
+    if message and message.receiver_id == user_id and not message.is_read:
+        if (await db.execute(_flag_as_read(message.id))).rowcount:
+            await adjust_unread_counters_async(db, user_id, messages=-1)
+        await db.commit()
+    
+    return message
+
+async def mark_message_as_read_async(
+    db: AsyncSession,
+    message_id: int,
+    user_id: int
+) -> Message:
+    result = await db.execute(
+        select(Message).filter(
+            Message.id == message_id,
+            Message.receiver_id == user_id
+        )
+    )
+    message = result.scalars().first()
+    
+    if message:
+        if (await db.execute(_flag_as_read(message.id))).rowcount:
+            await adjust_unread_counters_async(db, user_id, messages=-1)
+        await db.commit()
+    
+    return message
+
+async def mark_messages_as_read_async(
+    db: AsyncSession,
+    user_id: int,
+    ids: Optional[List[int]] = None,
+    up_to_id: Optional[int] = None
+) -> int:
+    updated = (await db.execute(_mark_read_batch(user_id, ids, up_to_id))).rowcount
+    await adjust_unread_counters_async(db, user_id, messages=-updated)
+    await db.commit()
+    return updated
+
+async def delete_message_async(
+    db: AsyncSession,
+    message_id: int,
+    user_id: int
+) -> bool:
+    result = await db.execute(
+        select(Message).filter(
+            Message.id == message_id,
+            (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+        )
+    )
+    message = result.scalars().first()
+    
+    if message:
+        if not message.is_read:
+            await adjust_unread_counters_async(db, message.receiver_id, messages=-1)
+        schedule_file_removal(db, [message])
+        await db.delete(message)
+        await db.commit()
+        return True
+    
+    return False 
+
+async def delete_messages_async(
+    db: AsyncSession,
+    user_id: int,
+    message_type: Optional[str] = None,
+    ids: Optional[List[int]] = None,
+    up_to_id: Optional[int] = None
+) -> int:
+    deleted = (await db.execute(_delete_batch(user_id, message_type, ids, up_to_id))).all()
+    await adjust_unread_counters_bulk_async(db, messages=_unread_by_receiver(deleted))
+    schedule_file_removal(db, deleted)
+    await db.commit()
+    return len(deleted)
\ No newline at end of file
@@ -1,8 +1,43 @@
+from sqlalchemy import select, insert, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.notification import Notification
 from models.user import User
-from models.course import Course
-from typing import List
+from models.course import Course, CourseMaterial, CourseProgress
+from services.job_queue import enqueue_job, register_job_handler
+from services.counter_service import (
+    adjust_unread_counters,
+    adjust_unread_counters_async,
+    adjust_unread_counters_bulk
+)
+from typing import List, Optional
+from pagination import apply_cursor
+from push import publish_after_commit
+from collections import Counter
+from datetime import datetime
+import os
+
+# Nombre de lignes par INSERT multi-lignes lors des envois groupés
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "500"))
+
+def _notification_payload(values: dict) -> dict:
+    return {
+        "id": values.get("id"),
+        "title": values["title"],
+        "message": values["message"],
+        "type": values["type"],
+        "is_read": False,
+        "created_at": values["created_at"],
+        "related_course_id": values.get("related_course_id"),
+        "related_material_id": values.get("related_material_id")
+    }
+
+def _publish_notification(db, notification: Notification):
+    # Flush préalable : id et created_at sont connus avant le commit
+    publish_after_commit(db, notification.user_id, "notification", _notification_payload({
+        column: getattr(notification, column)
+        for column in ("id", "title", "message", "type", "created_at", "related_course_id", "related_material_id")
+    }))
 
 def create_notification(
     db: Session,
@@ -22,23 +57,68 @@ def create_notification(
         related_material_id=material_id
     )
     db.add(notification)
+    adjust_unread_counters(db, user_id, notifications=1)
+    db.flush()
+    _publish_notification(db, notification)
     db.commit()
     db.refresh(notification)
     return notification
 
+def create_notifications_bulk(
+    db: Session,
+    notifications: List[dict],
+    chunk_size: int = NOTIFICATION_BATCH_SIZE,
+    commit: bool = True
+) -> int:
+    # Une seule transaction, un INSERT multi-lignes par tranche, sans refresh
+    if not notifications:
+        return 0
+    
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "user_id": notification["user_id"],
+            "title": notification["title"],
+            "message": notification["message"],
+            "type": notification["type"],
+            "related_course_id": notification.get("course_id"),
+            "related_material_id": notification.get("material_id"),
+            "is_read": False,
+            "created_at": created_at
+        }
+        for notification in notifications
+    ]
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(Notification).values(rows[start:start + chunk_size]))
+    adjust_unread_counters_bulk(db, notifications=Counter(row["user_id"] for row in rows))
+    for row in rows:
+        publish_after_commit(db, row["user_id"], "notification", _notification_payload(row))
+    if commit:
+        db.commit()
+    return len(rows)
+
 def get_user_notifications(
     db: Session,
     user_id: int,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None
 ) -> List[Notification]:
-    return db.query(Notification)\
-        .filter(Notification.user_id == user_id)\
-        .order_by(Notification.created_at.desc())\
+    query = db.query(Notification)\
+        .filter(Notification.user_id == user_id)
+    
+    return apply_cursor(query, Notification.created_at, Notification.id, cursor)\
         .offset(skip)\
         .limit(limit)\
         .all()
 
+def _flag_as_read(notification_id: int):
+    # UPDATE conditionnel : seul le passage de non lu à lu décrémente le
+    # compteur, même si deux requêtes marquent la même notification
+    return update(Notification)\
+        .where(Notification.id == notification_id, Notification.is_read == False)\
+        .values(is_read=True)
+
 def mark_notification_as_read(
     db: Session,
     notification_id: int,
@@ -52,85 +132,237 @@ def mark_notification_as_read(
         .first()
     
     if notification:
-        notification.is_read = True
+        if db.execute(_flag_as_read(notification.id)).rowcount:
+            adjust_unread_counters(db, user_id, notifications=-1)
         db.commit()
         db.refresh(notification)
     
     return notification
 
+def _mark_read_batch(user_id: int, ids: Optional[List[int]], up_to_id: Optional[int]):
+    # Sans ids ni up_to_id : toutes les notifications non lues de l'utilisateur
+    stmt = update(Notification)\
+        .where(Notification.user_id == user_id, Notification.is_read == False)
+    if ids is not None:
+        stmt = stmt.where(Notification.id.in_(ids))
+    if up_to_id is not None:
+        stmt = stmt.where(Notification.id <= up_to_id)
+    return stmt.values(is_read=True).execution_options(synchronize_session=False)
+
+def mark_notifications_as_read(
+    db: Session,
+    user_id: int,
+    ids: Optional[List[int]] = None,
+    up_to_id: Optional[int] = None
+) -> int:
+    updated = db.execute(_mark_read_batch(user_id, ids, up_to_id)).rowcount
+    adjust_unread_counters(db, user_id, notifications=-updated)
+    db.commit()
+    return updated
+
+async def create_notification_async(
+    db: AsyncSession,
+    user_id: int,
+    title: str,
+    message: str,
+    type: str,
+    course_id: int = None,
+    material_id: int = None
+) -> Notification:
+    notification = Notification(
+        user_id=user_id,
+        title=title,
+        message=message,
+        type=type,
+        related_course_id=course_id,
+        related_material_id=material_id
+    )
+    db.add(notification)
+    await adjust_unread_counters_async(db, user_id, notifications=1)
+    await db.flush()
+    _publish_notification(db, notification)
+    await db.commit()
+    await db.refresh(notification)
+    return notification
+
+async def get_user_notifications_async(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> List[Notification]:
+    query = select(Notification)\
+        .filter(Notification.user_id == user_id)
+    
+    result = await db.execute(
+        apply_cursor(query, Notification.created_at, Notification.id, cursor)
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def mark_notification_as_read_async(
+    db: AsyncSession,
+    notification_id: int,
+    user_id: int
+) -> Notification:
+    result = await db.execute(
+        select(Notification).filter(
+            Notification.id == notification_id,
+            Notification.user_id == user_id
+        )
+    )
+    notification = result.scalars().first()
+    
+    if notification:
+        if (await db.execute(_flag_as_read(notification.id))).rowcount:
+            await adjust_unread_counters_async(db, user_id, notifications=-1)
+        await db.commit()
+    
+    return notification
+
+async def mark_notifications_as_read_async(
+    db: AsyncSession,
+    user_id: int,
+    ids: Optional[List[int]] = None,
+    up_to_id: Optional[int] = None
+) -> int:
+    updated = (await db.execute(_mark_read_batch(user_id, ids, up_to_id))).rowcount
+    await adjust_unread_counters_async(db, user_id, notifications=-updated)
+    await db.commit()
+    return updated
+
+# Les notify_* n'écrivent plus les notifications pendant la requête : ils
+# mettent un événement en file, traité par lots par le worker de job_queue.
 def notify_course_created(
     db: Session,
     course: Course
 ):
-    # Notify admin
-    admin = db.query(User).filter(User.role == "admin").first()
-    if admin:
-        create_notification(
-            db=db,
-            user_id=admin.id,
-            title="Nouveau cours créé",
-            message=f"Le cours '{course.title}' a été créé par {course.instructor.nom} {course.instructor.prenom}",
-            type="course_created",
-            course_id=course.id
-        )
+    enqueue_job(db, "notification", {
+        "event": "course_created",
+        "course_id": course.id,
+        "course_title": course.title,
+        "instructor": f"{course.instructor.nom} {course.instructor.prenom}"
+    })
 
 def notify_course_deleted(
     db: Session,
     course: Course
 ):
-    # Notify admin
-    admin = db.query(User).filter(User.role == "admin").first()
-    if admin:
-        create_notification(
-            db=db,
-            user_id=admin.id,
-            title="Cours supprimé",
-            message=f"Le cours '{course.title}' a été supprimé",
-            type="course_deleted",
-            course_id=course.id
-        )
+    # Le cours n'existera plus au moment de l'envoi : pas de course_id
+    enqueue_job(db, "notification", {
+        "event": "course_deleted",
+        "course_title": course.title
+    })
 
 def notify_material_added(
     db: Session,
     course: Course,
     material
 ):
-    # Notify admin
-    admin = db.query(User).filter(User.role == "admin").first()
-    if admin:
-        create_notification(
-            db=db,
-            user_id=admin.id,
-            title="Nouveau matériel ajouté",
-            message=f"Un nouveau matériel a été ajouté au cours '{course.title}'",
-            type="material_added",
-            course_id=course.id,
-            material_id=material.id
-        )
-    
-    # Notify enrolled students
-    for progress in course.progress_records:
-        create_notification(
-            db=db,
-            user_id=progress.user_id,
-            title="Nouveau matériel disponible",
-            message=f"Un nouveau matériel est disponible dans le cours '{course.title}'",
-            type="material_added",
-            course_id=course.id,
-            material_id=material.id
-        )
+    enqueue_job(db, "notification", {
+        "event": "material_added",
+        "course_id": course.id,
+        "course_title": course.title,
+        "material_id": material.id
+    })
 
 def notify_course_progress(
     db: Session,
     user_id: int,
     course: Course,
-    progress: float
+    progress: float,
+    commit: bool = True
 ):
-    create_notification(
-        db=db,
-        user_id=user_id,
-        title="Progression mise à jour",
-        message=f"Votre progression dans le cours '{course.title}' est maintenant de {progress}%",
-        type="progress_updated",
-        course_id=course.id
-    ) 
\ No newline at end of file
+    enqueue_job(db, "notification", {
+        "event": "progress_updated",
+        "user_id": user_id,
+        "course_id": course.id,
+        "course_title": course.title,
+        "progress": progress
+    }, commit=commit)
+
+def _notifications_for_event(db: Session, event: dict, admin_id: int) -> List[dict]:
+    notifications = []
+    
+    if event["event"] == "course_created" and admin_id:
+        notifications.append({
+            "user_id": admin_id,
+            "title": "Nouveau cours créé",
+            "message": f"Le cours '{event['course_title']}' a été créé par {event['instructor']}",
+            "type": "course_created",
+            "course_id": event["course_id"]
+        })
+    
+    elif event["event"] == "course_deleted" and admin_id:
+        notifications.append({
+            "user_id": admin_id,
+            "title": "Cours supprimé",
+            "message": f"Le cours '{event['course_title']}' a été supprimé",
+            "type": "course_deleted"
+        })
+    
+    elif event["event"] == "material_added":
+        # Notify admin
+        if admin_id:
+            notifications.append({
+                "user_id": admin_id,
+                "title": "Nouveau matériel ajouté",
+                "message": f"Un nouveau matériel a été ajouté au cours '{event['course_title']}'",
+                "type": "material_added",
+                "course_id": event["course_id"],
+                "material_id": event["material_id"]
+            })
+        
+        # Notify enrolled students
+        enrolled_user_ids = db.query(CourseProgress.user_id)\
+            .filter(CourseProgress.course_id == event["course_id"])
+        for (user_id,) in enrolled_user_ids:
+            notifications.append({
+                "user_id": user_id,
+                "title": "Nouveau matériel disponible",
+                "message": f"Un nouveau matériel est disponible dans le cours '{event['course_title']}'",
+                "type": "material_added",
+                "course_id": event["course_id"],
+                "material_id": event["material_id"]
+            })
+    
+    elif event["event"] == "progress_updated":
+        notifications.append({
+            "user_id": event["user_id"],
+            "title": "Progression mise à jour",
+            "message": f"Votre progression dans le cours '{event['course_title']}' est maintenant de {event['progress']}%",
+            "type": "progress_updated",
+            "course_id": event["course_id"]
+        })
+    
+    return notifications
+
+@register_job_handler("notification")
+def deliver_notification_events(db: Session, events: List[dict]):
+    admin = db.query(User).filter(User.role == "admin").first()
+    admin_id = admin.id if admin else None
+    
+    notifications = []
+    for event in events:
+        notifications.extend(_notifications_for_event(db, event, admin_id))
+    
+    # Le cours ou le support a pu être supprimé depuis la mise en file
+    course_ids = {n["course_id"] for n in notifications if n.get("course_id")}
+    material_ids = {n["material_id"] for n in notifications if n.get("material_id")}
+    existing_courses = {
+        course_id for (course_id,) in
+        db.query(Course.id).filter(Course.id.in_(course_ids))
+    } if course_ids else set()
+    existing_materials = {
+        material_id for (material_id,) in
+        db.query(CourseMaterial.id).filter(CourseMaterial.id.in_(material_ids))
+    } if material_ids else set()
+    for notification in notifications:
+        if notification.get("course_id") not in existing_courses:
+            notification["course_id"] = None
+        if notification.get("material_id") not in existing_materials:
+            notification["material_id"] = None
+    
+    create_notifications_bulk(db, notifications, commit=False)
\ No newline at end of file
@@ -0,0 +1,241 @@
+from sqlalchemy import update, bindparam, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models.course import Course, CourseProgress
+from services.notification_service import notify_course_progress
+from services.stats_service import adjust_course_stats, refresh_progress_sums
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+import asyncio
+import logging
+import math
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 0 : pas de tampon, chaque mise à jour est écrite immédiatement
+PROGRESS_FLUSH_INTERVAL_SECONDS = float(os.getenv("PROGRESS_FLUSH_INTERVAL_SECONDS", "10"))
+# Au-delà, le tampon est vidé sans attendre l'intervalle
+PROGRESS_BUFFER_MAX_ENTRIES = int(os.getenv("PROGRESS_BUFFER_MAX_ENTRIES", "5000"))
+# Notification seulement quand la progression franchit un multiple de ce pas
+PROGRESS_NOTIFY_STEP = float(os.getenv("PROGRESS_NOTIFY_STEP", "25"))
+
+class PendingProgress(NamedTuple):
+    progress: float
+    last_accessed: datetime
+
+# Copie des champs utilisés par la notification : l'objet Course appartient
+# à la session de la requête, fermée avant l'écriture du lot
+class CourseRef(NamedTuple):
+    id: int
+    title: str
+
+class PendingNotification(NamedTuple):
+    user_id: int
+    course: CourseRef
+    progress: float
+
+# Tampon en mémoire (un processus) des mises à jour de progression envoyées
+# toutes les quelques secondes par le lecteur : seule la dernière valeur par
+# (user_id, course_id) est conservée, puis écrite par lots. L'UPDATE ne
+# s'applique qu'aux cours non terminés dont last_accessed est plus ancien :
+# une valeur tamponnée (ici ou dans un autre processus) n'écrase jamais un
+# achèvement ni une écriture plus récente.
+class ProgressBuffer:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._pending: Dict[Tuple[int, int], PendingProgress] = {}
+        # Notifications de palier, mises en file avec le lot suivant
+        self._notifications: List[PendingNotification] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.recorded = 0
+        self.flushes = 0
+        self.entries_flushed = 0
+
+    def record(
+        self,
+        user_id: int,
+        course_id: int,
+        progress: float,
+        last_accessed: datetime,
+        notification: Optional[PendingNotification] = None
+    ) -> bool:
+        # Retourne True quand le tampon est plein et doit être vidé
+        with self._lock:
+            self._pending[(user_id, course_id)] = PendingProgress(progress, last_accessed)
+            if notification is not None:
+                self._notifications.append(notification)
+            self.recorded += 1
+            return len(self._pending) >= self.max_entries
+
+    def get(self, user_id: int, course_id: int) -> Optional[PendingProgress]:
+        with self._lock:
+            return self._pending.get((user_id, course_id))
+
+    def course_ids(self, user_id: int) -> List[int]:
+        # Cours d'un utilisateur ayant une valeur en attente d'écriture
+        with self._lock:
+            return [course_id for (pending_user_id, course_id) in self._pending if pending_user_id == user_id]
+
+    def discard(self, user_id: int, course_id: int):
+        with self._lock:
+            self._pending.pop((user_id, course_id), None)
+
+    def flush(self, db: Session) -> int:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                notifications, self._notifications = self._notifications, []
+            if not pending and not notifications:
+                return 0
+            try:
+                if pending:
+                    _write_progress(db, pending)
+                    refresh_progress_sums(db, {course_id for _, course_id in pending})
+                for notification in notifications:
+                    notify_course_progress(
+                        db, notification.user_id, notification.course, notification.progress, commit=False
+                    )
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Remettre les valeurs non écrites, sauf si une plus récente est arrivée
+                with self._lock:
+                    self._notifications[:0] = notifications
+                    for key, entry in pending.items():
+                        current = self._pending.get(key)
+                        if current is None or current.last_accessed < entry.last_accessed:
+                            self._pending[key] = entry
+                raise
+            self.flushes += 1
+            self.entries_flushed += len(pending)
+            return len(pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flush_interval_seconds": PROGRESS_FLUSH_INTERVAL_SECONDS,
+                "recorded": self.recorded,
+                "flushes": self.flushes,
+                "entries_flushed": self.entries_flushed,
+                "coalesced": self.recorded - self.entries_flushed - len(self._pending)
+            }
+
+progress_buffer = ProgressBuffer(PROGRESS_BUFFER_MAX_ENTRIES)
+
+def _write_progress(db: Session, pending: Dict[Tuple[int, int], PendingProgress]):
+    # Un seul UPDATE préparé, exécuté pour toutes les lignes (executemany)
+    progress_table = CourseProgress.__table__
+    db.execute(
+        update(progress_table)
+        .where(
+            progress_table.c.user_id == bindparam("b_user_id"),
+            progress_table.c.course_id == bindparam("b_course_id"),
+            or_(progress_table.c.is_completed == None, progress_table.c.is_completed == False),
+            or_(
+                progress_table.c.last_accessed == None,
+                progress_table.c.last_accessed < bindparam("b_last_accessed")
+            )
+        )
+        .values(progress=bindparam("b_progress"), last_accessed=bindparam("b_last_accessed")),
+        [
+            {
+                "b_user_id": user_id,
+                "b_course_id": course_id,
+                "b_progress": entry.progress,
+                "b_last_accessed": entry.last_accessed
+            }
+            for (user_id, course_id), entry in pending.items()
+        ]
+    )
+
+def current_progress(progress: CourseProgress) -> Tuple[float, datetime]:
+    # Valeur vue par l'utilisateur : la dernière mise à jour, même non écrite,
+    # sauf pour un cours terminé, que le lot n'écrasera pas. Accepte aussi une
+    # ligne de requête avec les mêmes colonnes.
+    pending = progress_buffer.get(progress.user_id, progress.course_id)
+    if pending is not None and not progress.is_completed and (
+        progress.last_accessed is None or pending.last_accessed > progress.last_accessed
+    ):
+        return pending.progress, pending.last_accessed
+    return progress.progress, progress.last_accessed
+
+def _crossed_threshold(previous: float, progress: float) -> bool:
+    if PROGRESS_NOTIFY_STEP <= 0:
+        return previous != progress
+    return math.floor(progress / PROGRESS_NOTIFY_STEP) > math.floor(previous / PROGRESS_NOTIFY_STEP)
+
+def update_progress(
+    db: Session,
+    progress: CourseProgress,
+    course: Course,
+    value: float
+) -> Tuple[float, datetime]:
+    previous, _ = current_progress(progress)
+    value = min(100, max(0, value))  # Ensure progress is between 0 and 100
+    now = datetime.utcnow()
+    # Notifier seulement aux paliers (25 %, 50 %, ...) et non à chaque appel
+    notify = _crossed_threshold(previous, value)
+
+    if value >= 100 or PROGRESS_FLUSH_INTERVAL_SECONDS <= 0:
+        # Achèvement (ou tampon désactivé) : écriture immédiate, la valeur
+        # tamponnée devenue obsolète est abandonnée
+        progress_buffer.discard(progress.user_id, progress.course_id)
+        adjust_course_stats(
+            db,
+            progress.course_id,
+            completed=1 if value >= 100 and not progress.is_completed else 0,
+            progress=value - (progress.progress or 0)
+        )
+        progress.progress = value
+        progress.last_accessed = now
+        if value >= 100 and not progress.is_completed:
+            progress.is_completed = True
+            progress.status = "Terminé"
+            progress.completion_date = now
+        if notify:
+            notify_course_progress(db, progress.user_id, course, value, commit=False)
+        db.commit()
+    else:
+        notification = PendingNotification(progress.user_id, CourseRef(course.id, course.title), value) if notify else None
+        if progress_buffer.record(progress.user_id, progress.course_id, value, now, notification):
+            progress_buffer.flush(db)
+    return value, now
+
+def _flush_buffer() -> int:
+    db = SessionLocal()
+    try:
+        return progress_buffer.flush(db)
+    finally:
+        db.close()
+
+async def run_progress_flusher():
+    while True:
+        await asyncio.sleep(PROGRESS_FLUSH_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(_flush_buffer)
+        except Exception:
+            logger.exception("Progress buffer flush failed")
+
+_flusher_task = None
+
+def start_progress_flusher():
+    global _flusher_task
+    if PROGRESS_FLUSH_INTERVAL_SECONDS > 0 and _flusher_task is None:
+        _flusher_task = asyncio.create_task(run_progress_flusher())
+
+async def stop_progress_flusher():
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+        _flusher_task = None
+    # Dernières valeurs écrites avant l'arrêt du processus
+    await run_in_threadpool(_flush_buffer)
@@ -0,0 +1,169 @@
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models.course import CourseProgress
+from models.report import DepartmentDailyStats, LearnerActivity
+from models.user import User
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+REPORT_ROLLUP_INTERVAL_SECONDS = float(os.getenv("REPORT_ROLLUP_INTERVAL_SECONDS", "900"))
+# Jours recalculés à chaque passage (aujourd'hui et la veille par défaut)
+REPORT_ROLLUP_DAYS = int(os.getenv("REPORT_ROLLUP_DAYS", "2"))
+
+def _bucket(departement: Optional[str]) -> str:
+    return departement or ""
+
+def rollup_departments(db, since: date) -> int:
+    # Recalcule les agrégats quotidiens à partir de `since` ; les jours
+    # antérieurs ne changent plus. Accepte une Session ou une Connection.
+    start = datetime.combine(since, datetime.min.time())
+    now = datetime.utcnow()
+    buckets: Dict[Tuple[date, str], dict] = {}
+
+    def bucket(day: date, departement: Optional[str]) -> dict:
+        return buckets.setdefault((day, _bucket(departement)), {
+            "enrollments": 0, "completions": 0, "completion_seconds": 0.0
+        })
+
+    enrollments = db.execute(
+        select(User.departement, CourseProgress.start_date)
+        .join(User, User.id == CourseProgress.user_id)
+        .where(CourseProgress.start_date >= start)
+    )
+    for departement, started_at in enrollments:
+        bucket(started_at.date(), departement)["enrollments"] += 1
+
+    completions = db.execute(
+        select(User.departement, CourseProgress.start_date, CourseProgress.completion_date)
+        .join(User, User.id == CourseProgress.user_id)
+        .where(CourseProgress.completion_date >= start)
+    )
+    for departement, started_at, completed_at in completions:
+        totals = bucket(completed_at.date(), departement)
+        totals["completions"] += 1
+        if started_at is not None:
+            totals["completion_seconds"] += max((completed_at - started_at).total_seconds(), 0)
+
+    # Jours d'activité : ajoutés, jamais retirés (last_accessed a pu avancer depuis)
+    accesses = db.execute(
+        select(CourseProgress.user_id, User.departement, CourseProgress.last_accessed)
+        .join(User, User.id == CourseProgress.user_id)
+        .where(CourseProgress.last_accessed >= start)
+    )
+    seen = {(accessed_at.date(), user_id): departement for user_id, departement, accessed_at in accesses}
+    known = set(db.execute(
+        select(LearnerActivity.day, LearnerActivity.user_id).where(LearnerActivity.day >= since)
+    ).all())
+    new_activity = [
+        {"day": day, "user_id": user_id, "departement": _bucket(departement)}
+        for (day, user_id), departement in seen.items()
+        if (day, user_id) not in known
+    ]
+    if new_activity:
+        db.execute(insert(LearnerActivity), new_activity)
+
+    active = db.execute(
+        select(LearnerActivity.day, LearnerActivity.departement, func.count(LearnerActivity.user_id))
+        .where(LearnerActivity.day >= since)
+        .group_by(LearnerActivity.day, LearnerActivity.departement)
+    )
+    for day, departement, learners in active:
+        bucket(day, departement)["active_learners"] = learners
+
+    db.execute(delete(DepartmentDailyStats).where(DepartmentDailyStats.day >= since))
+    if buckets:
+        db.execute(insert(DepartmentDailyStats), [
+            {
+                "day": day,
+                "departement": departement,
+                "enrollments": totals["enrollments"],
+                "completions": totals["completions"],
+                "completion_seconds": totals["completion_seconds"],
+                "active_learners": totals.get("active_learners", 0),
+                "computed_at": now
+            }
+            for (day, departement), totals in buckets.items()
+        ])
+    return len(buckets)
+
+def backfill_department_rollups(db) -> int:
+    # Tout l'historique, depuis la première inscription
+    first = db.execute(select(func.min(CourseProgress.start_date))).scalar()
+    if first is None:
+        return 0
+    return rollup_departments(db, first.date())
+
+def _rollup_recent_days() -> int:
+    db = SessionLocal()
+    try:
+        since = datetime.utcnow().date() - timedelta(days=max(REPORT_ROLLUP_DAYS, 1) - 1)
+        buckets = rollup_departments(db, since)
+        db.commit()
+        return buckets
+    finally:
+        db.close()
+
+async def run_report_rollups():
+    while True:
+        try:
+            await run_in_threadpool(_rollup_recent_days)
+        except Exception:
+            logger.exception("Department rollup failed")
+        await asyncio.sleep(REPORT_ROLLUP_INTERVAL_SECONDS)
+
+_rollup_task = None
+
+def start_report_rollups():
+    global _rollup_task
+    if REPORT_ROLLUP_INTERVAL_SECONDS > 0 and _rollup_task is None:
+        _rollup_task = asyncio.create_task(run_report_rollups())
+
+async def stop_report_rollups():
+    global _rollup_task
+    if _rollup_task is not None:
+        _rollup_task.cancel()
+        try:
+            await _rollup_task
+        except asyncio.CancelledError:
+            pass
+        _rollup_task = None
+
+def get_department_report(db: Session, start: date, end: date) -> dict:
+    # Lecture des seuls agrégats de la période : indépendante de la taille de l'historique
+    totals = {
+        row[0]: row[1:]
+        for row in db.query(
+            DepartmentDailyStats.departement,
+            func.sum(DepartmentDailyStats.enrollments),
+            func.sum(DepartmentDailyStats.completions),
+            func.sum(DepartmentDailyStats.completion_seconds)
+        )
+        .filter(DepartmentDailyStats.day >= start, DepartmentDailyStats.day <= end)
+        .group_by(DepartmentDailyStats.departement)
+    }
+    active = dict(
+        db.query(LearnerActivity.departement, func.count(func.distinct(LearnerActivity.user_id)))
+        .filter(LearnerActivity.day >= start, LearnerActivity.day <= end)
+        .group_by(LearnerActivity.departement)
+        .all()
+    )
+    rolled_up_at = db.query(func.max(DepartmentDailyStats.computed_at)).scalar()
+
+    departments: List[dict] = []
+    for departement in sorted(set(totals) | set(active)):
+        enrollments, completions, completion_seconds = (value or 0 for value in totals.get(departement, (0, 0, 0)))
+        departments.append({
+            "departement": departement or None,
+            "enrollments": enrollments,
+            "completions": completions,
+            "average_completion_days": round(completion_seconds / completions / 86400, 1) if completions else None,
+            "active_learners": active.get(departement, 0)
+        })
+    return {"start": start, "end": end, "rolled_up_at": rolled_up_at, "departments": departments}
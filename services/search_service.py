@@ -0,0 +1,148 @@
+from sqlalchemy import select, literal, literal_column, func, union_all, table, column, null
+from sqlalchemy.orm import Session
+from models.course import Course, CourseMaterial, MaterialPage
+from models.message import Message
+from models.user import User
+from services.course_service import visible_courses_clause
+from typing import Iterable, List, Optional
+import html
+import re
+
+SEARCH_KINDS = ("course", "material", "message")
+SNIPPET_TOKENS = 12
+MAX_QUERY_TERMS = 10
+
+# Marqueurs internes remplacés après échappement HTML du snippet
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+def fts_query(q: str) -> Optional[str]:
+    # Les termes saisis sont cités : aucun opérateur FTS5 ne passe de
+    # l'utilisateur à MATCH ; le dernier terme est cherché en préfixe
+    terms = re.findall(r"\w+", q)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _fts(name: str):
+    return table(name, column("rowid"))
+
+def _snippet(name: str):
+    return func.snippet(literal_column(name), -1, _MARK_START, _MARK_END, "…", SNIPPET_TOKENS)
+
+def _course_hits(match: str, user: User):
+    fts = _fts("courses_fts")
+    return select(
+        literal("course").label("kind"),
+        Course.id.label("id"),
+        Course.id.label("course_id"),
+        Course.title.label("title"),
+        _snippet("courses_fts").label("snippet"),
+        # Le titre pèse plus que la description
+        func.bm25(literal_column("courses_fts"), 10.0, 1.0).label("rank"),
+        Course.created_at.label("created_at"),
+        null().label("page")
+    )\
+        .select_from(fts)\
+        .join(Course, Course.id == fts.c.rowid)\
+        .where(literal_column("courses_fts").op("MATCH")(match))\
+        .where(visible_courses_clause(user))
+
+def _material_hits(match: str, user: User):
+    # Nom du fichier ou texte extrait (page par page) : seul le meilleur
+    # passage de chaque support est retenu
+    name_fts = _fts("course_materials_fts")
+    page_fts = _fts("material_pages_fts")
+    candidates = union_all(
+        select(
+            name_fts.c.rowid.label("material_id"),
+            null().label("page"),
+            _snippet("course_materials_fts").label("snippet"),
+            func.bm25(literal_column("course_materials_fts")).label("rank")
+        )\
+            .where(literal_column("course_materials_fts").op("MATCH")(match)),
+        select(
+            MaterialPage.material_id.label("material_id"),
+            MaterialPage.page_number.label("page"),
+            _snippet("material_pages_fts").label("snippet"),
+            func.bm25(literal_column("material_pages_fts")).label("rank")
+        )\
+            .select_from(page_fts)\
+            .join(MaterialPage, MaterialPage.id == page_fts.c.rowid)\
+            .where(literal_column("material_pages_fts").op("MATCH")(match))
+    ).subquery()
+    best = select(
+        candidates,
+        func.row_number().over(
+            partition_by=candidates.c.material_id,
+            order_by=candidates.c.rank
+        ).label("position")
+    ).subquery()
+    
+    return select(
+        literal("material").label("kind"),
+        CourseMaterial.id.label("id"),
+        CourseMaterial.course_id.label("course_id"),
+        CourseMaterial.file_name.label("title"),
+        best.c.snippet.label("snippet"),
+        best.c.rank.label("rank"),
+        CourseMaterial.uploaded_at.label("created_at"),
+        best.c.page.label("page")
+    )\
+        .select_from(best)\
+        .join(CourseMaterial, CourseMaterial.id == best.c.material_id)\
+        .join(Course, Course.id == CourseMaterial.course_id)\
+        .where(best.c.position == 1)\
+        .where(visible_courses_clause(user))
+
+def _message_hits(match: str, user: User):
+    fts = _fts("messages_fts")
+    return select(
+        literal("message").label("kind"),
+        Message.id.label("id"),
+        null().label("course_id"),
+        null().label("title"),
+        _snippet("messages_fts").label("snippet"),
+        func.bm25(literal_column("messages_fts")).label("rank"),
+        Message.created_at.label("created_at"),
+        null().label("page")
+    )\
+        .select_from(fts)\
+        .join(Message, Message.id == fts.c.rowid)\
+        .where(literal_column("messages_fts").op("MATCH")(match))\
+        .where((Message.sender_id == user.id) | (Message.receiver_id == user.id))
+
+_HIT_QUERIES = {
+    "course": _course_hits,
+    "material": _material_hits,
+    "message": _message_hits,
+}
+
+def _highlight(snippet: Optional[str]) -> Optional[str]:
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+def search(
+    db: Session,
+    user: User,
+    q: str,
+    kinds: Iterable[str] = SEARCH_KINDS,
+    skip: int = 0,
+    limit: int = 20
+) -> List[dict]:
+    match = fts_query(q)
+    if match is None:
+        return []
+    
+    # Un SELECT par type, fusionnés et classés ensemble par bm25 (plus petit = meilleur)
+    hits = union_all(*(_HIT_QUERIES[kind](match, user) for kind in kinds)).subquery()
+    rows = db.execute(
+        select(hits)
+        .order_by(hits.c.rank, hits.c.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
+    
+    return [{**row, "snippet": _highlight(row["snippet"])} for row in rows]
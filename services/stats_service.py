@@ -0,0 +1,162 @@
+from sqlalchemy import select, update, delete, insert, func, case, literal
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+from models.course import CourseProgress
+from models.stats import CourseStats
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+import sys
+
+# Les statistiques sont modifiées dans la transaction de l'écriture qui les
+# concerne (inscription, achèvement, lot de progressions) : un rollback
+# annule les deux. Seules les inscriptions d'utilisateurs existants comptent.
+def _stats_upsert(dialect_name: str):
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = dialect.insert(CourseStats)
+    return stmt.on_conflict_do_update(
+        index_elements=[CourseStats.course_id],
+        set_={
+            "enrolled_count": CourseStats.enrolled_count + stmt.excluded.enrolled_count,
+            "completed_count": CourseStats.completed_count + stmt.excluded.completed_count,
+            "progress_sum": CourseStats.progress_sum + stmt.excluded.progress_sum,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+
+def adjust_course_stats(
+    db: Session,
+    course_id: int,
+    enrolled: int = 0,
+    completed: int = 0,
+    progress: float = 0.0
+):
+    if not (enrolled or completed or progress):
+        return
+    db.execute(_stats_upsert(db.bind.dialect.name), [{
+        "course_id": course_id,
+        "enrolled_count": enrolled,
+        "completed_count": completed,
+        "progress_sum": progress,
+        "updated_at": datetime.utcnow()
+    }])
+
+def refresh_progress_sums(db: Session, course_ids: Iterable[int]):
+    # Après l'écriture d'un lot de progressions : l'ancienne valeur des lignes
+    # n'est pas connue, la somme des seuls cours concernés est recalculée
+    # (index course_id), une fois par lot et non à chaque appel du lecteur
+    course_ids = list(course_ids)
+    if not course_ids:
+        return
+    progress_sum = select(func.coalesce(func.sum(CourseProgress.progress), 0))\
+        .where(CourseProgress.course_id == CourseStats.course_id, CourseProgress.user_id != None)\
+        .scalar_subquery()
+    db.execute(
+        update(CourseStats)
+        .where(CourseStats.course_id.in_(course_ids))
+        .values(progress_sum=progress_sum, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+def _aggregates(course_ids: Optional[List[int]] = None):
+    query = select(
+        CourseProgress.course_id,
+        func.count(CourseProgress.id),
+        func.sum(case((CourseProgress.is_completed == True, 1), else_=0)),
+        func.coalesce(func.sum(CourseProgress.progress), 0)
+    )\
+        .where(CourseProgress.course_id != None, CourseProgress.user_id != None)\
+        .group_by(CourseProgress.course_id)
+    if course_ids is not None:
+        query = query.where(CourseProgress.course_id.in_(course_ids))
+    return query
+
+def rebuild_course_stats(db, course_ids: Optional[List[int]] = None):
+    # Recalcul depuis course_progress, complet ou limité à quelques cours ;
+    # accepte une Session ou une Connection
+    clear = delete(CourseStats)
+    if course_ids is not None:
+        clear = clear.where(CourseStats.course_id.in_(course_ids))
+    db.execute(clear)
+    aggregates = _aggregates(course_ids).subquery()
+    db.execute(insert(CourseStats).from_select(
+        ["course_id", "enrolled_count", "completed_count", "progress_sum", "updated_at"],
+        select(aggregates, literal(datetime.utcnow()))
+    ))
+
+def check_course_stats(db) -> List[dict]:
+    # Écarts entre la table course_stats et course_progress ; une ligne
+    # absente équivaut à des compteurs à zéro
+    expected = {row[0]: tuple(row[1:]) for row in db.execute(_aggregates())}
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in db.execute(select(
+            CourseStats.course_id,
+            CourseStats.enrolled_count,
+            CourseStats.completed_count,
+            CourseStats.progress_sum
+        ))
+    }
+    mismatches = []
+    for course_id in sorted(set(expected) | set(stored)):
+        want = expected.get(course_id, (0, 0, 0.0))
+        have = stored.get(course_id, (0, 0, 0.0))
+        if want[:2] != have[:2] or abs((want[2] or 0) - (have[2] or 0)) > 1e-6:
+            mismatches.append({"course_id": course_id, "expected": want, "stored": have})
+    return mismatches
+
+def _as_stats(course_id: int, row) -> dict:
+    enrolled, completed, progress_sum, updated_at = row if row else (0, 0, 0.0, None)
+    enrolled = max(enrolled or 0, 0)
+    completed = max(completed or 0, 0)
+    return {
+        "course_id": course_id,
+        "enrolled": enrolled,
+        "completed": completed,
+        "completion_rate": round(completed * 100 / enrolled, 1) if enrolled else 0.0,
+        "average_progress": round((progress_sum or 0) / enrolled, 1) if enrolled else 0.0,
+        "updated_at": updated_at
+    }
+
+def get_course_stats_many(db: Session, course_ids: List[int]) -> Dict[int, dict]:
+    rows = {
+        row[0]: row[1:]
+        for row in db.execute(
+            select(
+                CourseStats.course_id,
+                CourseStats.enrolled_count,
+                CourseStats.completed_count,
+                CourseStats.progress_sum,
+                CourseStats.updated_at
+            ).where(CourseStats.course_id.in_(course_ids))
+        )
+    }
+    return {course_id: _as_stats(course_id, rows.get(course_id)) for course_id in course_ids}
+
+def get_course_stats(db: Session, course_id: int) -> dict:
+    return get_course_stats_many(db, [course_id])[course_id]
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    if sys.argv[1:] not in (["check"], ["rebuild"]):
+        print("Usage: python -m services.stats_service check|rebuild")
+        sys.exit(1)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if sys.argv[1] == "rebuild":
+            rebuild_course_stats(db)
+            db.commit()
+            print("Statistiques des cours recalculées")
+        else:
+            mismatches = check_course_stats(db)
+            for mismatch in mismatches:
+                print(
+                    f"cours {mismatch['course_id']}: attendu {mismatch['expected']}, "
+                    f"enregistré {mismatch['stored']}"
+                )
+            print(f"{len(mismatches)} écart(s)")
+            sys.exit(1 if mismatches else 0)
+    finally:
+        db.close()
@@ -0,0 +1,167 @@
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from models.user import User
+from schemas import UserImport
+from auth import get_password_hash
+from cache import principal_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+import csv
+import io
+import json
+import multiprocessing
+import os
+
+# Processus de hachage bcrypt pour un import (créés puis arrêtés à chaque import)
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Comptes insérés par transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "10000"))
+IMPORT_MAX_FILE_BYTES = int(os.getenv("IMPORT_MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+IMPORT_ROLES = ("employer", "prof", "admin")
+
+class ImportFormatError(Exception):
+    pass
+
+def parse_user_file(content: bytes, filename: Optional[str] = None) -> List[dict]:
+    # CSV avec en-tête (nom, prenom, departement, role, email, telephone,
+    # password) ou tableau JSON d'objets avec les mêmes champs
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFormatError("File must be UTF-8 encoded")
+    is_json = filename.lower().endswith(".json") if filename else text.lstrip().startswith("[")
+    if is_json:
+        try:
+            records = json.loads(text)
+        except ValueError as error:
+            raise ImportFormatError(f"Invalid JSON: {error}")
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ImportFormatError("JSON file must contain a list of objects")
+    else:
+        records = list(csv.DictReader(io.StringIO(text)))
+    if len(records) > IMPORT_MAX_ROWS:
+        raise ImportFormatError(f"At most {IMPORT_MAX_ROWS} users per import")
+    return records
+
+def _row_error(row: int, record: dict, error: str) -> dict:
+    email = record.get("email")
+    return {"row": row, "email": email if isinstance(email, str) else None, "error": error}
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+def _validate(records: List[dict], errors: List[dict]) -> List[Tuple[int, UserImport]]:
+    valid = []
+    seen = set()
+    for row, record in enumerate(records, start=1):
+        # Cellules CSV vides : champ absent
+        record = {key: value for key, value in record.items() if key and value not in ("", None)}
+        try:
+            user = UserImport.model_validate(record)
+        except ValidationError as error:
+            errors.append(_row_error(row, record, _describe(error)))
+            continue
+        if user.role not in IMPORT_ROLES:
+            errors.append(_row_error(row, record, f"role must be one of {', '.join(IMPORT_ROLES)}"))
+        elif user.email in seen:
+            errors.append(_row_error(row, record, "Duplicate email in file"))
+        else:
+            seen.add(user.email)
+            valid.append((row, user))
+    return valid
+
+def _registered_emails(db: Session, emails: List[str]) -> set:
+    registered = set()
+    for start in range(0, len(emails), IMPORT_BATCH_SIZE):
+        registered.update(db.execute(
+            select(User.email).where(User.email.in_(emails[start:start + IMPORT_BATCH_SIZE]))
+        ).scalars())
+    return registered
+
+def _hash_passwords(passwords: List[str]) -> Iterator[str]:
+    # bcrypt est volontairement lent (BCRYPT_ROUNDS) : les mots de passe sont
+    # hachés en parallèle dans des processus, dans l'ordre, pendant que les
+    # lots déjà hachés sont insérés
+    workers = min(IMPORT_HASH_WORKERS, len(passwords))
+    if workers <= 1:
+        yield from map(get_password_hash, passwords)
+        return
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        yield from pool.map(get_password_hash, passwords, chunksize=max(1, min(64, len(passwords) // (workers * 4))))
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def _insert_batch(db: Session, batch: List[Tuple[int, UserImport]], rows: List[dict], errors: List[dict]) -> int:
+    try:
+        db.execute(insert(User), rows)
+        db.commit()
+        return len(rows)
+    except IntegrityError:
+        db.rollback()
+    # Email enregistré entre-temps : ligne par ligne pour isoler les rejets
+    created = 0
+    for (row, user), values in zip(batch, rows):
+        try:
+            db.execute(insert(User), [values])
+            db.commit()
+            created += 1
+        except IntegrityError:
+            db.rollback()
+            errors.append({"row": row, "email": user.email, "error": "Email already registered"})
+    return created
+
+def import_users(db: Session, records: List[dict], approve: bool = False) -> dict:
+    # Les lignes invalides sont signalées (numéro de ligne de données, à
+    # partir de 1) sans empêcher l'import des autres
+    errors: List[dict] = []
+    valid = _validate(records, errors)
+    registered = _registered_emails(db, [user.email for _, user in valid])
+    for row, user in valid:
+        if user.email in registered:
+            errors.append({"row": row, "email": user.email, "error": "Email already registered"})
+    valid = [(row, user) for row, user in valid if user.email not in registered]
+
+    created = 0
+    now = datetime.utcnow()
+    with closing(_hash_passwords([user.password for _, user in valid])) as hashes:
+        for start in range(0, len(valid), IMPORT_BATCH_SIZE):
+            batch = valid[start:start + IMPORT_BATCH_SIZE]
+            rows = [
+                {
+                    **user.model_dump(exclude={"password"}),
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                    "is_approved": approve,
+                    "created_at": now
+                }
+                for (_, user), hashed_password in zip(batch, hashes)
+            ]
+            created += _insert_batch(db, batch, rows, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "failed": len(errors), "errors": errors}
+
+def set_approval(db: Session, user_ids: Iterable[int], is_approved: bool) -> dict:
+    # Une lecture et un UPDATE pour toute la liste, au lieu d'un aller-retour par compte
+    user_ids = list(dict.fromkeys(user_ids))
+    users = dict(db.execute(select(User.id, User.email).where(User.id.in_(user_ids))).all())
+    if users:
+        db.execute(
+            update(User)
+            .where(User.id.in_(list(users)))
+            .values(is_approved=is_approved)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    # Un compte révoqué est refusé dès la requête suivante
+    for email in users.values():
+        principal_cache.invalidate(email)
+    return {"count": len(users), "not_found": [user_id for user_id in user_ids if user_id not in users]}
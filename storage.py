@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+import hashlib
+from typing import NamedTuple
+from fastapi import UploadFile
+from sqlalchemy import select, delete, event
+from sqlalchemy.orm import Session
+from models import Blob, CourseMaterial, Message
+from utils import UPLOAD_DIR, MAX_UPLOAD_SIZE_BYTES, UPLOAD_CHUNK_SIZE, StoredFile, stream_to_temp_file
+
+# Stockage adressé par contenu : chaque fichier est enregistré une seule fois
+# sous uploads/blobs/<2 premiers caractères>/<sha256>, et la table blobs compte
+# les supports de cours et messages qui le référencent.
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+STAGING_DIR = os.path.join(BLOB_DIR, "tmp")
+
+class StagedUpload(NamedTuple):
+    temp_path: str
+    size: int
+    sha256: str
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256)
+
+def stage_upload(file: UploadFile) -> StagedUpload:
+    # Écriture en flux dans la zone de transit (aucun accès base de données)
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    return StagedUpload(*stream_to_temp_file(file, STAGING_DIR, MAX_UPLOAD_SIZE_BYTES))
+
+def _place_file(source_path: str, sha256: str) -> str:
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(source_path)
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.chmod(source_path, 0o644)
+    os.replace(source_path, path)
+    return path
+
+def add_blob_reference(
+    db: Session,
+    source_path: str,
+    size: int,
+    sha256: str,
+    remove_on_rollback: bool = True
+) -> StoredFile:
+    # Le compteur est incrémenté (flush) avant de déposer le fichier, afin que
+    # la collecte d'un blob orphelin ne puisse pas supprimer un fichier réutilisé.
+    # Le fichier d'un nouveau blob est retiré si la transaction n'est pas validée.
+    blob = db.get(Blob, sha256)
+    if blob is None:
+        blob = Blob(sha256=sha256, path=blob_path(sha256), size=size, ref_count=1)
+        db.add(blob)
+        if remove_on_rollback:
+            db.info.setdefault("placed_blobs", set()).add(sha256)
+    else:
+        blob.ref_count = Blob.ref_count + 1
+    db.flush()
+    return StoredFile(_place_file(source_path, sha256), size, sha256)
+
+def commit_staged_upload(db: Session, staged: StagedUpload) -> StoredFile:
+    # Déjà présent : le fichier en transit est simplement supprimé
+    return add_blob_reference(db, staged.temp_path, staged.size, staged.sha256)
+
+def discard_staged_upload(staged: StagedUpload):
+    if os.path.exists(staged.temp_path):
+        os.remove(staged.temp_path)
+
+def store_upload(db: Session, file: UploadFile) -> StoredFile:
+    staged = stage_upload(file)
+    try:
+        return commit_staged_upload(db, staged)
+    except BaseException:
+        discard_staged_upload(staged)
+        raise
+
+def release_blob(db: Session, sha256: str):
+    # Décrémente le compteur dans la transaction de l'appelant ; le fichier
+    # d'un blob qui n'est plus référencé est supprimé seulement après le
+    # commit (un rollback restaure la ligne, le fichier doit rester)
+    db.query(Blob)\
+        .filter(Blob.sha256 == sha256)\
+        .update({Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False)
+    deleted = db.query(Blob)\
+        .filter(Blob.sha256 == sha256, Blob.ref_count <= 0)\
+        .delete(synchronize_session=False)
+    if deleted:
+        db.info.setdefault("released_blobs", set()).add(sha256)
+
+def _remove_blob_file(sha256: str):
+    path = blob_path(sha256)
+    try:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        # Déjà supprimé, ou répertoire encore utilisé par d'autres blobs
+        pass
+
+def _remove_unreferenced_blobs(session: Session, candidates: set):
+    # Le même contenu a pu être déposé à nouveau entre-temps : le DELETE
+    # (idempotent) prend le verrou d'écriture, puis seuls les fichiers sans
+    # ligne dans blobs sont supprimés. Un dépôt concurrent incrémente le
+    # compteur avant de placer son fichier, il attend donc ce verrou.
+    with session.get_bind().begin() as connection:
+        connection.execute(delete(Blob).where(Blob.sha256.in_(candidates), Blob.ref_count <= 0))
+        referenced = set(connection.execute(select(Blob.sha256).where(Blob.sha256.in_(candidates))).scalars())
+        for sha256 in sorted(candidates - referenced):
+            _remove_blob_file(sha256)
+
+@event.listens_for(Session, "after_commit")
+def _remove_released_blobs(session: Session):
+    session.info.pop("placed_blobs", None)
+    released = session.info.pop("released_blobs", None)
+    if released:
+        _remove_unreferenced_blobs(session, released)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _keep_released_blobs(session: Session, previous_transaction):
+    session.info.pop("released_blobs", None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _remove_placed_blobs(session: Session, transaction):
+    # Transaction annulée ou session fermée sans commit (after_commit a déjà
+    # vidé la liste sinon) : les fichiers des nouveaux blobs n'ont plus de ligne
+    if transaction.parent is not None:
+        return
+    placed = session.info.pop("placed_blobs", None)
+    if placed:
+        _remove_unreferenced_blobs(session, placed)
+
+def _hash_file(path: str):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as source:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+def _original_name(path: str) -> str:
+    # Retire le préfixe horodaté (YYYYmmdd_HHMMSS_) ajouté lors de l'enregistrement
+    return re.sub(r"^\d{8}_\d{6}_", "", os.path.basename(path))
+
+def _remove_empty_dirs(path: str):
+    directory = os.path.dirname(path)
+    while directory and os.path.abspath(directory) != os.path.abspath(UPLOAD_DIR):
+        if not os.path.isdir(directory) or os.listdir(directory):
+            break
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
+def migrate_to_blob_store(db: Session) -> dict:
+    # Déduplique l'arborescence existante : chaque fichier référencé par un
+    # support ou un message est déplacé dans le stockage adressé par contenu
+    stats = {"files": 0, "deduplicated": 0, "bytes_saved": 0, "missing": 0}
+    blob_root = os.path.abspath(BLOB_DIR)
+    
+    for model in (CourseMaterial, Message):
+        records = db.query(model)\
+            .filter(model.file_path != None)\
+            .order_by(model.id)\
+            .all()
+        for record in records:
+            if os.path.abspath(record.file_path).startswith(blob_root):
+                continue
+            if not os.path.exists(record.file_path):
+                stats["missing"] += 1
+                continue
+            
+            old_path = record.file_path
+            size, sha256 = _hash_file(old_path)
+            already_stored = db.get(Blob, sha256) is not None
+            # Fichier d'origine déplacé, pas une copie : jamais supprimé
+            stored = add_blob_reference(db, old_path, size, sha256, remove_on_rollback=False)
+            
+            record.file_path = stored.path
+            record.file_size = size
+            record.sha256 = sha256
+            if model is Message and not record.file_name:
+                record.file_name = _original_name(old_path)
+            db.commit()
+            _remove_empty_dirs(old_path)
+            
+            stats["files"] += 1
+            if already_stored:
+                stats["deduplicated"] += 1
+                stats["bytes_saved"] += size
+    
+    return stats
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    if sys.argv[1:] != ["dedup"]:
+        print("Usage: python storage.py dedup")
+        sys.exit(1)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        stats = migrate_to_blob_store(db)
+        print(
+            f"{stats['files']} fichiers migrés, {stats['deduplicated']} doublons "
+            f"({stats['bytes_saved']} octets économisés), {stats['missing']} introuvables"
+        )
+    finally:
+        db.close()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Base SQLite jetable, fixée avant l'import de l'application
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from auth import create_access_token, get_password_hash
+from database import SessionLocal, engine
+from models import User
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(main.app)
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def make_user(db):
+    created = []
+
+    def make(role: str, departement: str = "IT") -> User:
+        user = User(nom=f"{role}{len(created)}", prenom="Test", departement=departement, role=role,
+                    email=f"{role}{len(created)}-{os.urandom(4).hex()}@test.dz", telephone="0",
+                    hashed_password=get_password_hash("test"), is_active=True, is_approved=True)
+        db.add(user)
+        db.commit()
+        created.append(user)
+        return user
+    return make
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.email})}"}
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, connection, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+@pytest.fixture
+def count_statements():
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
@@ -0,0 +1,55 @@
+from models import Course, CourseMaterial, CourseProgress
+from response_cache import response_cache
+from conftest import auth_headers
+
+# Les tableaux de bord ne doivent pas exécuter une requête par cours (N+1) :
+# même nombre d'instructions SQL avec 1 cours et avec 20
+
+def add_courses(db, instructor, count: int, learner=None):
+    for index in range(count):
+        course = Course(title=f"Cours {index}", description="", instructor_id=instructor.id,
+                        departement=instructor.departement)
+        db.add(course)
+        db.flush()
+        db.add_all(CourseMaterial(course_id=course.id, file_name=f"support{n}.pdf", file_path="",
+                                  file_type="application/pdf") for n in range(2))
+        if learner is not None:
+            db.add(CourseProgress(user_id=learner.id, course_id=course.id, progress=50))
+    db.commit()
+
+def dashboard_statements(client, count_statements, path: str, headers: dict) -> tuple:
+    # Premier appel : principal mis en cache ; puis appel mesuré sans cache de réponse
+    assert client.get(path, headers=headers).status_code == 200
+    response_cache.invalidate("courses")
+    count_statements.count = 0
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return count_statements.count, response.json()
+
+def test_prof_dashboard_statement_count_is_constant(client, db, make_user, count_statements):
+    prof, learner = make_user("prof"), make_user("employer")
+    headers = auth_headers(prof)
+
+    add_courses(db, prof, 1, learner)
+    few, body = dashboard_statements(client, count_statements, "/dashboard/prof", headers)
+    assert len(body["courses"]) == 1
+
+    add_courses(db, prof, 19, learner)
+    many, body = dashboard_statements(client, count_statements, "/dashboard/prof", headers)
+    assert len(body["courses"]) == 20
+    assert all(len(course["materials"]) == 2 for course in body["courses"])
+    assert many == few
+
+def test_employer_dashboard_statement_count_is_constant(client, db, make_user, count_statements):
+    prof, employer = make_user("prof", "RH"), make_user("employer", "RH")
+    headers = auth_headers(employer)
+
+    add_courses(db, prof, 1)
+    few, body = dashboard_statements(client, count_statements, "/dashboard/employer", headers)
+    courses = len(body["available_courses"])
+
+    add_courses(db, prof, 19)
+    many, body = dashboard_statements(client, count_statements, "/dashboard/employer", headers)
+    assert len(body["available_courses"]) == courses + 19
+    assert all(course["materials_count"] == 2 for course in body["available_courses"])
+    assert many == few
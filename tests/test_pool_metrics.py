@@ -0,0 +1,19 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from database import InstrumentedQueuePool
+
+# Une attente qui finit en dépassement de pool_timeout ne compte ni comme
+# connexion obtenue ni dans le temps d'attente moyen
+
+def test_timeout_is_not_counted_as_a_checkout():
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.2)
+    held = pool.connect()
+    with pytest.raises(PoolTimeoutError):
+        pool.connect()
+    held.close()
+
+    assert (pool.checkouts, pool.timeouts) == (1, 1)
+    assert pool.max_wait < 0.2
@@ -0,0 +1,23 @@
+from cache import PrincipalCache, SharedVersions
+
+# Deux workers : chacun son cache en mémoire, mêmes versions sur disque
+
+def test_invalidation_reaches_other_workers(tmp_path):
+    first = PrincipalCache(60, 16, SharedVersions(str(tmp_path)))
+    second = PrincipalCache(60, 16, SharedVersions(str(tmp_path)))
+    for cache in (first, second):
+        cache.set("user@test.dz", {"is_approved": True}, cache.version("user@test.dz"))
+        assert cache.get("user@test.dz") == {"is_approved": True}
+
+    # Révocation traitée par le premier worker
+    first.invalidate("user@test.dz")
+    assert second.get("user@test.dz") is None
+    assert first.get("user@test.dz") is None
+
+def test_entry_loaded_during_an_invalidation_is_stale(tmp_path):
+    cache = PrincipalCache(60, 16, SharedVersions(str(tmp_path)))
+    version = cache.version("user@test.dz")
+    # Invalidation par un autre worker entre la lecture de la version et le chargement
+    SharedVersions(str(tmp_path)).bump("user@test.dz")
+    cache.set("user@test.dz", {"is_approved": True}, version)
+    assert cache.get("user@test.dz") is None
@@ -0,0 +1,35 @@
+from models import Course, CourseProgress
+from services.progress_service import progress_buffer
+from services.stats_service import get_course_stats
+from conftest import auth_headers
+
+# Une progression tamponnée avant l'achèvement (dans ce worker ou un autre)
+# ne doit pas écraser les 100 % au vidage du tampon
+
+def test_buffered_progress_does_not_overwrite_completion(client, db, make_user):
+    prof, learner = make_user("prof"), make_user("employer")
+    headers = auth_headers(learner)
+    course = Course(title="Cours", description="", instructor_id=prof.id, departement=prof.departement)
+    db.add(course)
+    db.commit()
+    assert client.post(f"/courses/{course.id}/enroll", headers=headers).status_code == 200
+
+    response = client.put(f"/courses/{course.id}/progress", params={"progress_value": 40}, headers=headers)
+    assert response.status_code == 200
+    stale = progress_buffer.get(learner.id, course.id)
+    assert stale is not None and stale.progress == 40
+
+    assert client.put(f"/courses/{course.id}/complete", headers=headers).status_code == 200
+    # La complétion ne vide que le tampon de ce processus : un autre worker
+    # garde encore l'ancienne valeur
+    progress_buffer.record(learner.id, course.id, stale.progress, stale.last_accessed)
+    progress_buffer.flush(db)
+
+    db.expire_all()
+    progress = db.query(CourseProgress).filter_by(user_id=learner.id, course_id=course.id).one()
+    assert progress.is_completed and progress.progress == 100
+    stats = get_course_stats(db, course.id)
+    assert stats["completed"] == 1
+    assert stats["average_progress"] == 100
+    response = client.get(f"/courses/{course.id}/progress", headers=headers)
+    assert response.json()["course_details"]["progress"] == "100.0%"
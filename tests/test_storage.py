@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+import pytest
+
+import storage
+from models import Blob
+
+# Un fichier déposé pour un nouveau blob ne doit pas survivre à une
+# transaction annulée : il n'aurait aucune ligne dans blobs
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BLOB_DIR", str(tmp_path / "blobs"))
+
+def add_file(db, tmp_path, content: bytes):
+    source = tmp_path / f"staged-{os.urandom(4).hex()}"
+    source.write_bytes(content)
+    return storage.add_blob_reference(db, str(source), len(content), hashlib.sha256(content).hexdigest())
+
+def test_new_blob_file_is_removed_on_rollback(db, tmp_path):
+    stored = add_file(db, tmp_path, b"rollback")
+    assert os.path.exists(stored.path)
+    db.rollback()
+    assert not os.path.exists(stored.path)
+    assert db.get(Blob, stored.sha256) is None
+
+def test_new_blob_file_is_removed_when_the_session_closes_without_commit(db, tmp_path):
+    stored = add_file(db, tmp_path, b"close")
+    db.close()
+    assert not os.path.exists(stored.path)
+
+def test_committed_and_existing_blob_files_are_kept(db, tmp_path):
+    stored = add_file(db, tmp_path, b"kept")
+    db.commit()
+    assert os.path.exists(stored.path)
+
+    # Nouvelle référence au même contenu, puis annulation : le blob existait déjà
+    add_file(db, tmp_path, b"kept")
+    db.rollback()
+    assert os.path.exists(stored.path)
+    assert db.get(Blob, stored.sha256).ref_count == 1
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from models import Course, CourseProgress
+from conftest import auth_headers
+
+# Les statistiques de /users/me incluent les progressions encore dans le
+# tampon d'écriture, comme /courses/{course_id}/progress
+
+def test_statistics_include_buffered_progress(client, db, make_user):
+    prof, learner = make_user("prof"), make_user("employer")
+    headers = auth_headers(learner)
+    courses = [Course(title=f"Cours {index}", description="", instructor_id=prof.id,
+                      departement=prof.departement) for index in range(2)]
+    db.add_all(courses)
+    db.commit()
+    for course in courses:
+        assert client.post(f"/courses/{course.id}/enroll", headers=headers).status_code == 200
+
+    # Premier cours terminé trois jours après l'inscription
+    db.query(CourseProgress).filter_by(user_id=learner.id, course_id=courses[0].id)\
+        .update({CourseProgress.start_date: datetime.utcnow() - timedelta(days=3, hours=1)})
+    db.commit()
+    assert client.put(f"/courses/{courses[0].id}/complete", headers=headers).status_code == 200
+    # Second cours : valeur tamponnée, pas encore écrite
+    response = client.put(f"/courses/{courses[1].id}/progress", params={"progress_value": 40}, headers=headers)
+    assert response.status_code == 200
+
+    body = client.get("/users/me", headers=headers).json()
+    assert body["statistics"] == {
+        "total_cours_suivis": 2,
+        "cours_termines": 1,
+        "progression_moyenne": "70.0%",
+        "temps_moyen_completion": "3.0 jours"
+    }
+    assert [course["progres"] for course in body["courses"]] == ["100.0%", "40.0%"]
@@ -1,30 +1,50 @@
 import os
-import shutil
+import hashlib
+import tempfile
+from typing import NamedTuple
 from fastapi import UploadFile
-from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
 
 UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_SIZE_BYTES = int(os.getenv("MAX_UPLOAD_SIZE_BYTES", str(100 * 1024 * 1024)))
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum upload size of {max_size} bytes")
+        self.max_size = max_size
+
+class StoredFile(NamedTuple):
+    path: str
+    size: int
+    sha256: str
 
 def ensure_upload_dir():
     if not os.path.exists(UPLOAD_DIR):
         os.makedirs(UPLOAD_DIR)
 
-def save_uploaded_file(file: UploadFile, course_id: int) -> str:
-    ensure_upload_dir()
-    
-    # Create course-specific directory
-    course_dir = os.path.join(UPLOAD_DIR, str(course_id))
-    if not os.path.exists(course_dir):
-        os.makedirs(course_dir)
-    
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{timestamp}_{file.filename}"
-    file_path = os.path.join(course_dir, unique_filename)
-    
-    # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return file_path 
\ No newline at end of file
+def stream_to_temp_file(file: UploadFile, directory: str, max_size: int = MAX_UPLOAD_SIZE_BYTES):
+    # Copie par blocs dans un fichier temporaire du répertoire cible, en
+    # calculant le SHA-256 et en s'arrêtant dès que la taille maximale est dépassée
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                buffer.write(chunk)
+            buffer.flush()
+            os.fsync(buffer.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, size, digest.hexdigest()
\ No newline at end of file